@@ -1,23 +1,466 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
 import random
+import atexit
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import math
+import mimetypes
 import time
 import sqlite3
 import os
-from datetime import datetime
-
-app = Flask(__name__)
+import sys
+import queue
+import threading
+import click
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from decimal import Decimal, DecimalException, ROUND_CEILING, ROUND_FLOOR, ROUND_HALF_EVEN
+from email.utils import parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:  # opcional: sem brotli o frontend é servido só com gzip
+    brotli = None
+
+# Os ficheiros estáticos são servidos por static_asset(), já versionados e comprimidos
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
 # Configuração do banco de dados
 DATABASE = 'usdt_monitor.db'
-
-def init_db():
-    """Inicializar banco de dados"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '16'))
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 32768
+DB_MMAP_SIZE = 256 * 1024 * 1024
+# Escritor único: cada lote de escritas é gravado numa só transação (um só fsync) com até
+# DB_WRITE_BATCH_SIZE operações, juntadas durante no máximo DB_WRITE_BATCH_MS milissegundos
+DB_WRITE_QUEUE_SIZE = int(os.environ.get('DB_WRITE_QUEUE_SIZE', '1024'))
+DB_WRITE_BATCH_SIZE = int(os.environ.get('DB_WRITE_BATCH_SIZE', '128'))
+DB_WRITE_BATCH_MS = int(os.environ.get('DB_WRITE_BATCH_MS', '5'))
+# Tempo máximo que quem escreve espera por lugar na fila cheia, e depois pelo commit
+DB_WRITE_QUEUE_TIMEOUT = 30
+DB_WRITE_TIMEOUT = 60
+
+# Número máximo de carteiras consultadas em paralelo na TronGrid
+FETCH_CONCURRENCY = int(os.environ.get('FETCH_CONCURRENCY', '8'))
+
+# API TronGrid
+TRONGRID_URL = 'https://api.trongrid.io'
+USDT_CONTRACT = 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
+# Valores guardados como inteiros nas unidades base do token (micro-USDT)
+USDT_DECIMALS = 6
+USDT_UNIT = 10 ** USDT_DECIMALS
+# Limites do INTEGER do SQLite (64 bits com sinal); fora deles o sqlite3 recusa o parâmetro
+SQLITE_INT_MIN = -2 ** 63
+SQLITE_INT_MAX = 2 ** 63 - 1
+TRONGRID_TIMEOUT = 10
+# Um servidor que nem aceita a conexão é detetado muito antes do timeout de leitura
+TRONGRID_CONNECT_TIMEOUT = 3.05
+# Novas tentativas em falhas transitórias (5xx, 429, erros de rede) com recuo exponencial
+TRONGRID_MAX_RETRIES = int(os.environ.get('TRONGRID_MAX_RETRIES', '3'))
+TRONGRID_BACKOFF_BASE = 0.5
+TRONGRID_BACKOFF_MAX = 8.0
+TRONGRID_RETRY_AFTER_MAX = 60.0
+TRONGRID_RETRY_STATUS = {429, 500, 502, 503, 504}
+# Chaves de API (separadas por vírgulas) e ritmo máximo de pedidos por segundo de cada uma;
+# sem chaves, os pedidos anónimos seguem TRONGRID_ANON_RPS
+TRONGRID_API_KEYS = [key.strip() for key in os.environ.get('TRONGRID_API_KEYS', '').split(',') if key.strip()]
+TRONGRID_KEY_RPS = float(os.environ.get('TRONGRID_KEY_RPS', '10'))
+TRONGRID_ANON_RPS = float(os.environ.get('TRONGRID_ANON_RPS', '2'))
+# Pausa de uma chave limitada pela TronGrid, quando a resposta não traz Retry-After
+TRONGRID_KEY_COOLDOWN = 30.0
+# Disjuntor: falhas seguidas até abrir e espera (dobrada a cada teste falhado) até ao próximo teste
+TRONGRID_BREAKER_THRESHOLD = int(os.environ.get('TRONGRID_BREAKER_THRESHOLD', '5'))
+TRONGRID_BREAKER_RESET = float(os.environ.get('TRONGRID_BREAKER_RESET', '30'))
+TRONGRID_BREAKER_RESET_MAX = 300.0
+# Cache curto das páginas da TronGrid (segundos; 0 desativa) e número máximo de páginas guardadas
+TRONGRID_CACHE_TTL = float(os.environ.get('TRONGRID_CACHE_TTL', '10'))
+TRONGRID_CACHE_SIZE = int(os.environ.get('TRONGRID_CACHE_SIZE', '512'))
+
+# Motor de ingestão: 'wallets' consulta cada carteira; 'events' percorre os eventos Transfer
+# do contrato USDT uma vez por ciclo e filtra as carteiras vigiadas em memória
+INGESTION_MODE = os.environ.get('INGESTION_MODE', 'wallets')
+EVENT_SCAN_PAGE_SIZE = 200
+EVENT_SCAN_MAX_PAGES = int(os.environ.get('EVENT_SCAN_MAX_PAGES', '100'))
+# Sem cursor guardado, a primeira passagem começa este tempo atrás (o histórico é do backfill)
+EVENT_SCAN_LOOKBACK_MS = 60 * 60 * 1000
+
+# Sincronização incremental: tamanho da página e máximo de páginas por carteira em cada varredura
+SYNC_PAGE_SIZE = 50
+SYNC_MAX_PAGES = int(os.environ.get('SYNC_MAX_PAGES', '20'))
+
+# Backfill do histórico completo: página máxima da TronGrid e pausa entre páginas
+BACKFILL_PAGE_SIZE = 200
+BACKFILL_PAGE_DELAY = float(os.environ.get('BACKFILL_PAGE_DELAY', '1.0'))
+# Segundos que o encerramento espera pelo backfill em curso gravar o estado 'paused'
+BACKFILL_STOP_TIMEOUT = 5
+
+# Agendador de monitorização no servidor (intervalo e variação aleatória em segundos)
+AUTO_MONITOR = os.environ.get('AUTO_MONITOR', '0') == '1'
+MONITOR_INTERVAL = int(os.environ.get('MONITOR_INTERVAL', '120'))
+MONITOR_JITTER = int(os.environ.get('MONITOR_JITTER', '15'))
+MIN_MONITOR_INTERVAL = 10
+# Concessão da varredura partilhada entre processos: renovada a cada terço do prazo e
+# libertada sozinha se o processo que a tinha morrer
+SWEEP_LEASE_TTL = 60
+# Trabalhos de monitorização concluídos que ficam consultáveis em /api/monitor/jobs/<id>
+MONITOR_JOB_HISTORY = 100
+# Agendamento adaptativo por carteira (modo 'wallets'): carteiras ativas são consultadas a cada
+# POLL_MIN_INTERVAL segundos; cada consulta sem novidades multiplica o intervalo por POLL_BACKOFF
+# até POLL_MAX_INTERVAL
+ADAPTIVE_POLLING = os.environ.get('ADAPTIVE_POLLING', '1') == '1'
+POLL_MIN_INTERVAL = int(os.environ.get('POLL_MIN_INTERVAL', '30'))
+POLL_MAX_INTERVAL = int(os.environ.get('POLL_MAX_INTERVAL', '3600'))
+POLL_BACKOFF = 2
+# Intervalo inicial: uma fração do tempo desde a última transação conhecida
+POLL_IDLE_RATIO = 10
+POLL_BATCH_SIZE = FETCH_CONCURRENCY * 4
+
+# Arrancar o agendador dentro do processo web (0 quando se usa `flask --app main scheduler`)
+SCHEDULER_IN_PROCESS = os.environ.get('SCHEDULER_IN_PROCESS', '1') == '1'
+
+# Paginação das listagens de transações
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Linhas lidas do cursor SQLite por bloco na exportação em streaming
+EXPORT_CHUNK_SIZE = 1000
+
+# Duplicados suspeitos: saídas com o mesmo valor a menos desta distância (1 hora)
+DUPLICATE_WINDOW_MS = int(os.environ.get('DUPLICATE_WINDOW_MS', '3600000'))
+
+# Canal de eventos (Server-Sent Events)
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', '200'))
+SSE_CLIENT_BUFFER = 64
+SSE_KEEPALIVE = 15
+SSE_MAX_EVENT_TRANSACTIONS = 50
+
+# Cache em memória das respostas JSON das listagens (chave: rota, filtros, versão dos dados)
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', '256'))
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Frontend e compressão das respostas
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+
+class TronAPIError(Exception):
+    """Falha ao consultar a API TronGrid"""
+
+class CircuitOpenError(TronAPIError):
+    """TronGrid considerada em baixo: o pedido falhou sem chegar a ser enviado"""
+
+class RateLimitedError(TronAPIError):
+    """A TronGrid continuou a limitar o pedido (429) depois de todas as novas tentativas"""
+
+class SweepInProgressError(Exception):
+    """Já existe uma varredura de monitorização em curso"""
+
+class TooManySubscribersError(Exception):
+    """Limite de clientes ligados ao canal de eventos atingido"""
+
+class WriterBusyError(Exception):
+    """O escritor do banco não conseguiu aceitar ou gravar a escrita a tempo"""
+
+class WriteQueueFullError(WriterBusyError):
+    """A fila do escritor do banco continuou cheia durante DB_WRITE_QUEUE_TIMEOUT"""
+
+class WriteTimeoutError(WriterBusyError):
+    """A escrita não foi gravada em DB_WRITE_TIMEOUT (pode ainda vir a ser)"""
+
+class ConnectionPool:
+    """Pool de conexões SQLite persistentes
+
+    As conexões são abertas uma vez com WAL, synchronous=NORMAL, cache de
+    páginas, mmap e busy_timeout, e depois reutilizadas entre pedidos e
+    threads. Em WAL os leitores nunca ficam à espera de uma escrita em curso.
+    """
+    
+    def __init__(self, database, size=DB_POOL_SIZE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS):
+        self.database = database
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute(f'PRAGMA busy_timeout = {self.busy_timeout_ms}')
+        return conn
+    
+    def acquire(self):
+        """Obter uma conexão livre, abrindo uma nova se o pool ainda não estiver cheio"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        try:
+            return self._idle.get(timeout=self.busy_timeout_ms / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError('Pool de conexões esgotado') from None
+    
+    def release(self, conn):
+        """Devolver a conexão ao pool, desfazendo qualquer transação deixada aberta"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+    
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+    
+    def open_connection(self):
+        """Abrir uma conexão com a mesma configuração, fora do pool (p. ex. para o escritor)"""
+        return self._connect()
+    
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+db_pool = ConnectionPool(DATABASE)
+
+def get_db():
+    """Conexão do pool associada ao pedido atual (devolvida no fim do pedido)"""
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
+
+class DatabaseWriter:
+    """Thread única que aplica todas as escritas do banco, em lotes
+
+    Quem escreve entrega uma função fn(cursor, *args) numa fila limitada e
+    recebe um Future com o valor devolvido, resolvido só depois do commit.
+    A thread junta as operações que chegam (até `batch_size`, ou até
+    `batch_ms` depois da primeira) numa única transação, por isso o número de
+    fsyncs acompanha os lotes e não as escritas, e nunca há dois escritores a
+    disputar o lock do SQLite. Cada operação corre num SAVEPOINT: se falhar, só
+    ela é desfeita e o resto do lote é gravado. Com a fila cheia, submit()
+    bloqueia quem escreve até haver lugar (ou WriteQueueFullError).
+    
+    A thread usa uma conexão própria, fora do pool. Um erro inesperado faz
+    falhar só o lote em curso (a conexão é reaberta no lote seguinte), e se a
+    thread morrer mesmo assim é relançada na próxima escrita.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, pool, queue_size=DB_WRITE_QUEUE_SIZE, batch_size=DB_WRITE_BATCH_SIZE, batch_ms=DB_WRITE_BATCH_MS):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self.queue_full = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+    
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Escritor do banco já foi fechado')
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='db-writer', daemon=True)
+                self._thread.start()
+    
+    def submit(self, fn, *args, **kwargs):
+        """Pôr uma escrita na fila e retornar o seu Future"""
+        self._start()
+        future = Future()
+        try:
+            self._queue.put((fn, args, kwargs, future), timeout=DB_WRITE_QUEUE_TIMEOUT)
+        except queue.Full:
+            with self._lock:
+                self.queue_full += 1
+            raise WriteQueueFullError('Fila de escrita do banco cheia') from None
+        return future
+    
+    def execute(self, fn, *args, timeout=DB_WRITE_TIMEOUT, **kwargs):
+        """Aplicar uma escrita e esperar pelo commit do lote onde entrou"""
+        return self.wait(self.submit(fn, *args, **kwargs), timeout)
+    
+    @staticmethod
+    def wait(future, timeout=DB_WRITE_TIMEOUT):
+        """Esperar pelo resultado de uma escrita entregue com submit()"""
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            raise WriteTimeoutError('Escrita no banco não confirmada a tempo') from None
+    
+    def close(self, timeout=30):
+        """Gravar o que ainda estiver na fila e parar a thread"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+    
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while batch[-1] is not self._STOP and len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _loop(self):
+        conn = None
+        try:
+            while True:
+                batch = self._next_batch()
+                stop = batch[-1] is self._STOP
+                if stop:
+                    batch.pop()
+                if batch:
+                    try:
+                        if conn is None:
+                            conn = self.pool.open_connection()
+                        self._apply(conn, batch)
+                    except Exception as e:
+                        # Conexão em estado desconhecido: descartar e reabrir no próximo lote
+                        print(f"Erro no escritor do banco: {e}")
+                        self._fail(batch, e)
+                        if conn is not None:
+                            try:
+                                conn.close()
+                            except sqlite3.Error:
+                                pass
+                            conn = None
+                if stop:
+                    return
+        finally:
+            if conn is not None:
+                conn.close()
+    
+    def _fail(self, batch, error):
+        """Fazer falhar as escritas do lote que ainda não têm resultado"""
+        failed = 0
+        for _, _, _, future in batch:
+            if future.done():
+                continue
+            if future.running() or future.set_running_or_notify_cancel():
+                future.set_exception(error)
+                failed += 1
+        with self._lock:
+            self.failed += failed
+    
+    def _apply(self, conn, batch):
+        cursor = conn.cursor()
+        results = []
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            for fn, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute('SAVEPOINT db_write')
+                try:
+                    results.append((future, fn(cursor, *args, **kwargs), None))
+                    cursor.execute('RELEASE db_write')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO db_write')
+                    cursor.execute('RELEASE db_write')
+                    results.append((future, None, e))
+            conn.commit()
+        except Exception as e:
+            # Falha do próprio lote (BEGIN ou COMMIT): nada foi gravado
+            print(f"Erro ao gravar lote de {len(batch)} escrita(s): {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            self._fail(batch, e)
+            return
+        
+        with self._lock:
+            self.batches += 1
+            self.operations += len(results)
+            self.failed += sum(1 for _, _, error in results if error is not None)
+            self.largest_batch = max(self.largest_batch, len(results))
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
     
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'batches': self.batches,
+                'operations': self.operations,
+                'failed': self.failed,
+                'average_batch': round(self.operations / self.batches, 1) if self.batches else 0,
+                'largest_batch': self.largest_batch,
+                'queue_full': self.queue_full
+            }
+
+db_writer = DatabaseWriter(db_pool)
+atexit.register(db_writer.close)
+
+def _create_base_schema(cursor):
+    """Migração 1: tabelas base (IF NOT EXISTS, segura para bancos já existentes)"""
     # Tabela de carteiras
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS wallets (
@@ -48,61 +491,805 @@ def init_db():
         )
     ''')
     
-    conn.commit()
-    conn.close()
-    print("Banco de dados inicializado com sucesso!")
+    # Estado de sincronização incremental por carteira (marca d'água do último bloco visto)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS wallet_sync_state (
+            wallet_id INTEGER PRIMARY KEY,
+            last_block_timestamp INTEGER NOT NULL,
+            last_tx_hash TEXT,
+            last_synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (wallet_id) REFERENCES wallets (id)
+        )
+    ''')
+    
+    # Progresso do backfill por carteira (fingerprint da próxima página a buscar)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS wallet_backfill_state (
+            wallet_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            fingerprint TEXT,
+            pages_fetched INTEGER DEFAULT 0,
+            transactions_found INTEGER DEFAULT 0,
+            new_transactions INTEGER DEFAULT 0,
+            error TEXT,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (wallet_id) REFERENCES wallets (id)
+        )
+    ''')
+
+def _migrate_amounts_to_units(cursor):
+    """Migração 7: valores em unidades base inteiras (amount REAL -> amount_units INTEGER)
+
+    O SQLite não muda o tipo de uma coluna, por isso as duas tabelas são
+    reconstruídas, convertendo cada valor com ROUND(amount * 10^6).
+    """
+    cursor.execute('''
+        CREATE TABLE transactions_units (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT UNIQUE NOT NULL,
+            from_address TEXT NOT NULL,
+            to_address TEXT NOT NULL,
+            amount_units INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            block_number INTEGER,
+            wallet_id INTEGER,
+            note TEXT,
+            is_completed BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_seq INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (wallet_id) REFERENCES wallets (id)
+        )
+    ''')
+    cursor.execute(f'''
+        INSERT INTO transactions_units
+        (id, hash, from_address, to_address, amount_units, timestamp, type, block_number,
+         wallet_id, note, is_completed, created_at, updated_seq)
+        SELECT id, hash, from_address, to_address, CAST(ROUND(amount * {USDT_UNIT}) AS INTEGER), timestamp,
+               type, block_number, wallet_id, note, is_completed, created_at, updated_seq
+        FROM transactions
+    ''')
+    cursor.execute('DROP TABLE transactions')
+    cursor.execute('ALTER TABLE transactions_units RENAME TO transactions')
+    
+    cursor.execute('''
+        CREATE TABLE suspected_duplicates_units (
+            transaction_id INTEGER PRIMARY KEY,
+            amount_units INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (transaction_id) REFERENCES transactions (id)
+        )
+    ''')
+    cursor.execute(f'''
+        INSERT INTO suspected_duplicates_units (transaction_id, amount_units, timestamp, detected_at)
+        SELECT transaction_id, CAST(ROUND(amount * {USDT_UNIT}) AS INTEGER), timestamp, detected_at
+        FROM suspected_duplicates
+    ''')
+    cursor.execute('DROP TABLE suspected_duplicates')
+    cursor.execute('ALTER TABLE suspected_duplicates_units RENAME TO suspected_duplicates')
+    
+    # Os índices foram apagados com as tabelas antigas
+    for statement in (
+        'CREATE INDEX idx_transactions_timestamp ON transactions (timestamp)',
+        'CREATE INDEX idx_transactions_type_timestamp ON transactions (type, timestamp)',
+        'CREATE INDEX idx_transactions_wallet_timestamp ON transactions (wallet_id, timestamp)',
+        'CREATE INDEX idx_transactions_amount_timestamp ON transactions (amount_units, timestamp)',
+        "CREATE INDEX idx_transactions_outgoing_amount ON transactions (amount_units, timestamp) WHERE type = 'outgoing'",
+        'CREATE INDEX idx_transactions_from_timestamp ON transactions (from_address, timestamp)',
+        'CREATE INDEX idx_transactions_to_timestamp ON transactions (to_address, timestamp)',
+        'CREATE INDEX idx_transactions_updated_seq ON transactions (updated_seq)',
+        'CREATE INDEX idx_suspected_duplicates_timestamp ON suspected_duplicates (timestamp)'
+    ):
+        cursor.execute(statement)
+
+# Migrações versionadas (PRAGMA user_version). Cada passo é SQL ou uma função
+# que recebe o cursor; nunca alterar uma migração já publicada, só acrescentar.
+MIGRATIONS = [
+    (1, 'esquema inicial', [_create_base_schema]),
+    (2, 'índices de listagem e carteiras ativas', [
+        'CREATE INDEX IF NOT EXISTS idx_transactions_timestamp ON transactions (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_type_timestamp ON transactions (type, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_wallet_timestamp ON transactions (wallet_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_amount_timestamp ON transactions (amount, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_wallets_active ON wallets (id, address) WHERE is_active = 1'
+    ]),
+    (3, 'índice de saídas por valor para duplicados', [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_outgoing_amount ON transactions (amount, timestamp) WHERE type = 'outgoing'"
+    ]),
+    (4, 'duplicados materializados e configurações', [
+        '''
+        CREATE TABLE IF NOT EXISTS app_settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS suspected_duplicates (
+            transaction_id INTEGER PRIMARY KEY,
+            amount REAL NOT NULL,
+            timestamp INTEGER NOT NULL,
+            detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (transaction_id) REFERENCES transactions (id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_suspected_duplicates_timestamp ON suspected_duplicates (timestamp)'
+    ]),
+    (5, 'índices de contraparte para filtros de listagem', [
+        'CREATE INDEX IF NOT EXISTS idx_transactions_from_timestamp ON transactions (from_address, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_to_timestamp ON transactions (to_address, timestamp)'
+    ]),
+    (6, 'sequência de alterações para sincronização incremental', [
+        'ALTER TABLE transactions ADD COLUMN updated_seq INTEGER NOT NULL DEFAULT 0',
+        'UPDATE transactions SET updated_seq = id',
+        'CREATE INDEX IF NOT EXISTS idx_transactions_updated_seq ON transactions (updated_seq)',
+        '''
+        INSERT OR REPLACE INTO app_settings (key, value)
+        SELECT 'change_seq', COALESCE(MAX(updated_seq), 0) FROM transactions
+        '''
+    ]),
+    (7, 'valores inteiros em micro-USDT', [_migrate_amounts_to_units]),
+]
+
+def run_migrations(conn):
+    """Aplicar, cada uma na sua transação, as migrações ainda não aplicadas ao banco"""
+    cursor = conn.cursor()
+    current = cursor.execute('PRAGMA user_version').fetchone()[0]
+    
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        print(f"Aplicando migração {version}: {description}...")
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    
+    return current
 
-def get_tron_transactions_with_fallback(address, limit=50):
-    """Buscar transações USDT TRC20 com fallback para dados de demonstração"""
+def init_db():
+    """Inicializar banco de dados"""
+    conn = db_pool.acquire()
     try:
-        print(f"Buscando transações para {address}...")
+        version = run_migrations(conn)
+        sync_duplicate_window(conn)
+        conn.execute('PRAGMA optimize')
+    finally:
+        db_pool.release(conn)
+    print(f"Banco de dados inicializado com sucesso! (esquema v{version})")
+
+class TokenBucket:
+    """Balde de fichas: rajadas até `capacity` pedidos, repostas a `rate` por segundo
+
+    Não é thread-safe por si; o ApiKeyPool protege-o com o seu lock.
+    """
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def available(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+    
+    def take(self, now):
+        """Consumir uma ficha; retorna 0, ou os segundos até haver uma disponível"""
+        if self.available(now) >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class ApiKeySlot:
+    def __init__(self, key, rate):
+        self.key = key
+        self.max_rate = rate
+        self.bucket = TokenBucket(rate)
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+    
+    @property
+    def label(self):
+        if self.key is None:
+            return 'anónima'
+        return f'{self.key[:4]}…{self.key[-4:]}'
+
+class ApiKeyPool:
+    """Chaves da TronGrid partilhadas por todas as threads de busca
+
+    Cada chave tem o seu balde de fichas. acquire() escolhe, entre as chaves
+    fora de pausa, a que tem mais fichas (a menos usada) e espera quando
+    todas estão esgotadas, por isso o débito total é a soma dos ritmos das
+    chaves. Uma chave limitada pela TronGrid fica em pausa e o seu ritmo cai
+    para metade; cada pedido bem-sucedido devolve-lhe um pouco do ritmo.
+    """
+    
+    def __init__(self, keys, rate=TRONGRID_KEY_RPS, anonymous_rate=TRONGRID_ANON_RPS,
+                 cooldown=TRONGRID_KEY_COOLDOWN):
+        if keys:
+            self._slots = [ApiKeySlot(key, rate) for key in keys]
+        else:
+            self._slots = [ApiKeySlot(None, anonymous_rate)]
+        self.cooldown = cooldown
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Bloquear até uma chave ter uma ficha livre e retornar essa chave"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                ready = [slot for slot in self._slots if slot.cooldown_until <= now]
+                if ready:
+                    slot = max(ready, key=lambda candidate: candidate.bucket.available(now))
+                    wait = slot.bucket.take(now)
+                    if wait == 0:
+                        slot.requests += 1
+                        return slot
+                else:
+                    wait = min(slot.cooldown_until for slot in self._slots) - now
+                self.waits += 1
+                self.wait_seconds += wait
+            time.sleep(wait)
+    
+    def throttled(self, slot, cooldown=None):
+        with self._lock:
+            slot.throttled += 1
+            slot.cooldown_until = time.monotonic() + (self.cooldown if cooldown is None else cooldown)
+            slot.bucket.rate = max(slot.max_rate / 8, slot.bucket.rate / 2)
+    
+    def succeeded(self, slot):
+        with self._lock:
+            slot.bucket.rate = min(slot.max_rate, slot.bucket.rate + slot.max_rate / 20)
+    
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'waits': self.waits,
+                'wait_seconds': round(self.wait_seconds, 1),
+                'keys': [
+                    {
+                        'key': slot.label,
+                        'rate': round(slot.bucket.rate, 2),
+                        'max_rate': slot.max_rate,
+                        'requests': slot.requests,
+                        'throttled': slot.throttled,
+                        'cooldown_seconds': round(max(0.0, slot.cooldown_until - now), 1)
+                    }
+                    for slot in self._slots
+                ]
+            }
+
+class CircuitBreaker:
+    """Disjuntor da TronGrid: fechado → aberto → meio-aberto
+
+    Depois de `threshold` falhas seguidas (erros de rede, timeouts, 5xx) o
+    circuito abre e os pedidos falham logo com CircuitOpenError, sem esperar
+    pelo timeout. Passados `reset_timeout` segundos fica meio-aberto e deixa
+    passar um único pedido de teste: se a TronGrid responder, fecha; se falhar,
+    volta a abrir com o dobro da espera, até `max_reset_timeout`.
+    """
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, threshold=TRONGRID_BREAKER_THRESHOLD, reset_timeout=TRONGRID_BREAKER_RESET,
+                 max_reset_timeout=TRONGRID_BREAKER_RESET_MAX):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self._current_reset = reset_timeout
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def before_request(self):
+        """Levantar CircuitOpenError se o pedido não deve ser enviado"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self._retry_in() == 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(f'TronGrid indisponível, nova tentativa dentro de {self._retry_in():.0f}s')
+    
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print("TronGrid: pedido de teste bem-sucedido, circuito fechado")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._current_reset = self.reset_timeout
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._current_reset = min(self.max_reset_timeout, self._current_reset * 2)
+                self._open()
+            elif self.state == self.CLOSED and self.failures >= self.threshold:
+                self._open()
+    
+    def _open(self):
+        self.state = self.OPEN
+        self.trips += 1
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        print(f"TronGrid: circuito aberto após {self.failures} falha(s) seguida(s), "
+              f"novo teste em {self._current_reset:.0f}s")
+    
+    def _retry_in(self):
+        if self.state == self.CLOSED:
+            return 0.0
+        return max(0.0, self._opened_at + self._current_reset - time.monotonic())
+    
+    def retry_in(self):
+        """Segundos até ao próximo pedido de teste (0 com o circuito fechado)"""
+        with self._lock:
+            return self._retry_in()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'retry_in_seconds': round(self._retry_in(), 1)
+            }
+
+class TronGridClient:
+    """Cliente HTTP partilhado para a TronGrid
+
+    Usa uma única requests.Session com um pool de conexões keep-alive do
+    tamanho da concorrência de busca, para que cada carteira reutilize as
+    conexões TCP+TLS já abertas. Cada pedido espera por uma ficha do
+    ApiKeyPool e leva a chave escolhida no cabeçalho TRON-PRO-API-KEY; uma
+    chave limitada (429, ou 403 com chave) fica em pausa e o pedido repete
+    com outra. Respostas 5xx e erros de rede são repetidos com recuo
+    exponencial com jitter, respeitando o Retry-After, e contam para o
+    disjuntor, que faz falhar logo os pedidos enquanto a TronGrid estiver em baixo.
+    """
+    
+    def __init__(self, base_url=TRONGRID_URL, pool_size=FETCH_CONCURRENCY, timeout=TRONGRID_TIMEOUT,
+                 max_retries=TRONGRID_MAX_RETRIES, backoff_base=TRONGRID_BACKOFF_BASE,
+                 backoff_max=TRONGRID_BACKOFF_MAX, api_keys=TRONGRID_API_KEYS):
+        self.base_url = base_url
+        self.keys = ApiKeyPool(api_keys)
+        self.breaker = CircuitBreaker()
+        self.pool_size = pool_size
+        self.timeout = (TRONGRID_CONNECT_TIMEOUT, timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
         
-        # Tentar API TronGrid primeiro
-        url = f"https://api.trongrid.io/v1/accounts/{address}/transactions/trc20"
-        params = {
-            'limit': limit,
-            'contract_address': 'TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t'
-        }
-        headers = {
+        # pool_block: com o pool esgotado as threads esperam por uma conexão livre
+        # em vez de abrir conexões extra que seriam descartadas a seguir
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.headers.update({
             'Accept': 'application/json',
             'User-Agent': 'USDT-Monitor/1.0'
-        }
+        })
         
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        self._lock = threading.Lock()
+        self._retries = 0
+        self._failures = 0
+    
+    def get(self, path, params=None):
+        """Fazer um GET à TronGrid, repetindo falhas transitórias
+
+        Retorna a última resposta obtida (mesmo que de erro) ou levanta a
+        exceção de rede da última tentativa. Com o circuito aberto levanta
+        CircuitOpenError sem enviar o pedido, e RateLimitedError se todas as
+        tentativas foram limitadas.
+        """
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            slot = self.keys.acquire()
+            headers = {'TRON-PRO-API-KEY': slot.key} if slot.key else None
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    self._count_failure()
+                    raise
+                delay = self._backoff(attempt)
+                print(f"TronGrid: erro de rede ({e}), nova tentativa em {delay:.1f}s")
+            except requests.RequestException:
+                self.breaker.record_failure()
+                raise
+            else:
+                # Qualquer resposta abaixo de 500 (incluindo 429) mostra que a TronGrid está de pé
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if response.status_code == 429 or (slot.key and response.status_code == 403):
+                    self.keys.throttled(slot, self._retry_after(response))
+                    print(f"TronGrid: chave {slot.label} limitada ({response.status_code}), em pausa")
+                    if attempt >= self.max_retries:
+                        self._count_failure()
+                        response.close()
+                        raise RateLimitedError(f'TronGrid limitou o pedido ({response.status_code}) em todas as tentativas')
+                    # Sem recuo: acquire() já espera pela próxima chave disponível
+                    response.close()
+                    with self._lock:
+                        self._retries += 1
+                    attempt += 1
+                    continue
+                if response.status_code < 400:
+                    self.keys.succeeded(slot)
+                if response.status_code not in TRONGRID_RETRY_STATUS:
+                    return response
+                if attempt >= self.max_retries:
+                    self._count_failure()
+                    return response
+                delay = max(self._retry_after(response) or 0, self._backoff(attempt))
+                print(f"TronGrid: resposta {response.status_code}, nova tentativa em {delay:.1f}s")
+                response.close()
+            
+            with self._lock:
+                self._retries += 1
+            attempt += 1
+            time.sleep(delay)
+    
+    def _backoff(self, attempt):
+        # Recuo exponencial com "full jitter"
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    @staticmethod
+    def _retry_after(response):
+        """Segundos indicados no cabeçalho Retry-After (número ou data HTTP)"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        if math.isnan(seconds):
+            return None
+        return min(max(seconds, 0), TRONGRID_RETRY_AFTER_MAX)
+    
+    def _count_failure(self):
+        with self._lock:
+            self._failures += 1
+    
+    def stats(self):
+        """Contadores de pedidos e de conexões novas vs reutilizadas"""
+        requests_sent = 0
+        new_connections = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            requests_sent += pool.num_requests
+            new_connections += pool.num_connections
         
-        if response.status_code == 200:
-            data = response.json()
-            if 'data' in data and data['data']:
-                print(f"API Tron funcionou! {len(data['data'])} transações encontradas")
-                
-                transactions_found = []
-                for tx in data['data']:
-                    try:
-                        tx_type = 'outgoing' if tx['from'] == address else 'incoming'
-                        amount = float(tx['value']) / 1000000
-                        
-                        transaction = {
-                            'hash': tx['transaction_id'],
-                            'from_address': tx['from'],
-                            'to_address': tx['to'],
-                            'amount': amount,
-                            'timestamp': tx['block_timestamp'],
-                            'type': tx_type,
-                            'block_number': tx.get('block', 0)
-                        }
-                        transactions_found.append(transaction)
-                    except Exception as e:
-                        print(f"Erro ao processar transação: {e}")
-                        continue
-                
-                return transactions_found
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'requests': requests_sent,
+                'new_connections': new_connections,
+                'reused_connections': max(0, requests_sent - new_connections),
+                'retries': self._retries,
+                'failures': self._failures,
+                'rate_limit': self.keys.stats(),
+                'circuit': self.breaker.stats()
+            }
+
+# Pool dimensionado para a varredura ao vivo mais a thread de backfill
+trongrid_client = TronGridClient(pool_size=FETCH_CONCURRENCY + 1)
+
+def units_to_amount(units):
+    """Valor em USDT para a API (o inteiro em unidades base segue em amount_units)"""
+    return units / USDT_UNIT
+
+def format_amount(units):
+    """Valor exato em USDT com as 6 casas decimais, p. ex. 12.500000"""
+    return f'{units // USDT_UNIT}.{units % USDT_UNIT:0{USDT_DECIMALS}d}'
+
+def amount_to_units(value, rounding=ROUND_HALF_EVEN):
+    """Converter um valor decimal em USDT (texto ou número) em unidades base inteiras"""
+    try:
+        amount = Decimal(str(value).strip())
+        if not amount.is_finite():
+            raise ValueError(f'Valor inválido: {value}')
+        units = (amount * USDT_UNIT).to_integral_value(rounding=rounding)
+    except DecimalException:
+        # InvalidOperation para texto inválido, Overflow para expoentes enormes (1e999999999)
+        raise ValueError(f'Valor inválido: {value}') from None
+    # Comparado ainda como Decimal: int() de um expoente enorme seria caro
+    if not SQLITE_INT_MIN <= units <= SQLITE_INT_MAX:
+        raise ValueError(f'Valor fora do intervalo permitido: {value}')
+    return int(units)
+
+def parse_trc20_transfer(tx, address):
+    """Converter uma transferência TRC20 da TronGrid no formato interno"""
+    tx_type = 'outgoing' if tx['from'] == address else 'incoming'
+    
+    return {
+        'hash': tx['transaction_id'],
+        'from_address': tx['from'],
+        'to_address': tx['to'],
+        # `value` já vem em unidades base: guardado tal como está, sem passar por float
+        'amount_units': int(tx['value']),
+        'timestamp': tx['block_timestamp'],
+        'type': tx_type,
+        'block_number': tx.get('block', 0)
+    }
+
+class TtlCache:
+    """LRU com prazo de validade que junta pedidos iguais em curso ("single-flight")
+
+    Enquanto uma chave está a ser carregada, os outros pedidos pela mesma
+    chave esperam pelo resultado desse carregamento em vez de o repetir.
+    Só resultados bem-sucedidos ficam guardados; um erro é partilhado com
+    quem estava à espera e o pedido seguinte tenta de novo.
+    """
+    
+    def __init__(self, ttl=TRONGRID_CACHE_TTL, max_entries=TRONGRID_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def get_or_load(self, key, loader):
+        if self.ttl <= 0:
+            return loader()
         
-        print("API Tron não funcionou, usando dados de demonstração...")
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
         
-    except Exception as e:
-        print(f"Erro na API Tron: {e}, usando dados de demonstração...")
+        if not leader:
+            return future.result()
+        
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
     
-    # Fallback: dados de demonstração realistas
+    def stats(self):
+        with self._lock:
+            return {
+                'ttl': self.ttl,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced
+            }
+
+trongrid_cache = TtlCache()
+
+def get_tron_transactions(address, limit=50, min_timestamp=None, fingerprint=None, order_by=None):
+    """Buscar uma página de transferências USDT TRC20 na TronGrid
+
+    Retorna (transações, fingerprint da próxima página ou None).
+    Levanta TronAPIError se a API não responder corretamente. Páginas pedidas
+    há menos de TRONGRID_CACHE_TTL segundos vêm da cache, e pedidos iguais em
+    simultâneo (varredura manual, agendador, backfill) resultam num só pedido.
+    """
+    key = (address, USDT_CONTRACT, min_timestamp, fingerprint, order_by, limit)
+    transactions, next_fingerprint = trongrid_cache.get_or_load(
+        key,
+        lambda: _fetch_tron_transactions(address, limit, min_timestamp, fingerprint, order_by)
+    )
+    # A página guardada é partilhada: cada chamador recebe a sua própria lista
+    return list(transactions), next_fingerprint
+
+def get_trongrid_data(path, params):
+    """GET à TronGrid que retorna o JSON da resposta ou levanta TronAPIError"""
+    try:
+        response = trongrid_client.get(path, params=params)
+    except requests.RequestException as e:
+        raise TronAPIError(f"Falha de rede na TronGrid: {e}") from e
+    
+    if response.status_code != 200:
+        raise TronAPIError(f"TronGrid respondeu {response.status_code}")
+    
+    try:
+        data = response.json()
+    except ValueError as e:
+        raise TronAPIError(f"Resposta inválida da TronGrid: {e}") from e
+    
+    if not data.get('success', True) or 'data' not in data:
+        raise TronAPIError(f"TronGrid retornou erro: {data.get('error', 'resposta sem dados')}")
+    return data
+
+def _fetch_tron_transactions(address, limit, min_timestamp, fingerprint, order_by):
+    path = f"/v1/accounts/{address}/transactions/trc20"
+    params = {
+        'limit': limit,
+        'contract_address': USDT_CONTRACT
+    }
+    if min_timestamp is not None:
+        params['min_timestamp'] = min_timestamp
+    if fingerprint:
+        params['fingerprint'] = fingerprint
+    if order_by:
+        params['order_by'] = order_by
+    
+    data = get_trongrid_data(path, params)
+    transactions_found = []
+    for tx in data['data']:
+        try:
+            transactions_found.append(parse_trc20_transfer(tx, address))
+        except Exception as e:
+            print(f"Erro ao processar transação: {e}")
+            continue
+    
+    next_fingerprint = data.get('meta', {}).get('fingerprint')
+    return transactions_found, next_fingerprint
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+def tron_address_to_hex(address):
+    """Endereço Tron base58check (T…) para os 20 bytes em hexadecimal, sem o prefixo 41"""
+    number = 0
+    for char in address:
+        digit = BASE58_ALPHABET.find(char)
+        if digit < 0:
+            raise ValueError(f'Endereço Tron inválido: {address}')
+        number = number * 58 + digit
+    try:
+        raw = number.to_bytes(25, 'big')
+    except OverflowError:
+        raise ValueError(f'Endereço Tron inválido: {address}')
+    payload, checksum = raw[:21], raw[21:]
+    if payload[0] != 0x41 or hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != checksum:
+        raise ValueError(f'Endereço Tron inválido: {address}')
+    return payload[1:].hex()
+
+def tron_hex_to_address(value):
+    """Endereço em hexadecimal (0x…, 41… ou só os 20 bytes) para base58check (T…)"""
+    value = value.lower()
+    if value.startswith('0x'):
+        value = value[2:]
+    if len(value) == 40:
+        value = '41' + value
+    payload = bytes.fromhex(value)
+    raw = payload + hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    number = int.from_bytes(raw, 'big')
+    encoded = ''
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = BASE58_ALPHABET[remainder] + encoded
+    return encoded
+
+def _event_address_hex(value):
+    # A TronGrid devolve os endereços dos eventos em hexadecimal; aceitar também base58
+    if value.startswith('T'):
+        return tron_address_to_hex(value)
+    value = value.lower()
+    if value.startswith('0x'):
+        value = value[2:]
+    return value[-40:]
+
+def get_contract_transfer_events(min_timestamp, fingerprint=None, limit=EVENT_SCAN_PAGE_SIZE):
+    """Uma página de eventos Transfer do contrato USDT, por ordem crescente de bloco
+
+    Retorna (eventos, fingerprint da próxima página ou None).
+    """
+    key = ('events', USDT_CONTRACT, min_timestamp, fingerprint, limit)
+    
+    def load():
+        params = {
+            'event_name': 'Transfer',
+            'min_block_timestamp': min_timestamp,
+            'order_by': 'block_timestamp,asc',
+            'limit': limit
+        }
+        if fingerprint:
+            params['fingerprint'] = fingerprint
+        data = get_trongrid_data(f"/v1/contracts/{USDT_CONTRACT}/events", params)
+        return data['data'], data.get('meta', {}).get('fingerprint')
+    
+    events, next_fingerprint = trongrid_cache.get_or_load(key, load)
+    return list(events), next_fingerprint
+
+def match_transfer_events(events, watched):
+    """Agrupar por carteira os eventos Transfer que envolvem endereços vigiados
+
+    `watched` mapeia o endereço em hexadecimal para (wallet_id, endereço).
+    Como no modo por carteira, cada transação fica com uma única carteira:
+    a de origem, se for vigiada, senão a de destino.
+    """
+    by_wallet = {}
+    for event in events:
+        try:
+            result = event['result']
+            from_hex = _event_address_hex(result['from'])
+            to_hex = _event_address_hex(result['to'])
+            
+            if from_hex in watched:
+                (wallet_id, _), tx_type = watched[from_hex], 'outgoing'
+            elif to_hex in watched:
+                (wallet_id, _), tx_type = watched[to_hex], 'incoming'
+            else:
+                continue
+            
+            by_wallet.setdefault(wallet_id, []).append({
+                'hash': event['transaction_id'],
+                'from_address': tron_hex_to_address(from_hex),
+                'to_address': tron_hex_to_address(to_hex),
+                'amount_units': int(result['value']),
+                'timestamp': event['block_timestamp'],
+                'type': tx_type,
+                'block_number': event.get('block_number', 0)
+            })
+        except Exception as e:
+            print(f"Erro ao processar evento: {e}")
+    return by_wallet
+
+def get_demo_transactions(address):
+    """Gerar dados de demonstração realistas"""
     demo_transactions = []
     
     # Transações de saída
@@ -111,7 +1298,7 @@ def get_tron_transactions_with_fallback(address, limit=50):
             'hash': f"real_tx_{int(time.time())}_{random.randint(1000, 9999)}",
             'from_address': address,
             'to_address': f"TDemo{random.randint(10000, 99999)}{'0' * 15}",
-            'amount': round(random.uniform(50, 1000), 2),
+            'amount_units': random.randint(5000, 100000) * 10000,
             'timestamp': int((datetime.now().timestamp() - random.randint(3600, 86400)) * 1000),
             'type': 'outgoing',
             'block_number': random.randint(50000000, 60000000)
@@ -123,7 +1310,7 @@ def get_tron_transactions_with_fallback(address, limit=50):
             'hash': f"real_tx_{int(time.time())}_{random.randint(1000, 9999)}",
             'from_address': f"TDemo{random.randint(10000, 99999)}{'0' * 15}",
             'to_address': address,
-            'amount': round(random.uniform(100, 500), 2),
+            'amount_units': random.randint(10000, 50000) * 10000,
             'timestamp': int((datetime.now().timestamp() - random.randint(7200, 172800)) * 1000),
             'type': 'incoming',
             'block_number': random.randint(50000000, 60000000)
@@ -132,27 +1319,181 @@ def get_tron_transactions_with_fallback(address, limit=50):
     print(f"Geradas {len(demo_transactions)} transações de demonstração")
     return demo_transactions
 
+def get_tron_transactions_with_fallback(address, limit=50, min_timestamp=None):
+    """Buscar transações USDT TRC20 com fallback para dados de demonstração
+
+    Sem min_timestamp devolve as `limit` transferências mais recentes. Com
+    min_timestamp pede apenas as transferências a partir desse bloco, em ordem
+    crescente, seguindo o fingerprint da TronGrid até SYNC_MAX_PAGES páginas.
+
+    Retorna (transações, origem), com origem 'trongrid' ou 'demo'. Com o
+    circuito da TronGrid aberto levanta CircuitOpenError e com as chaves
+    limitadas RateLimitedError: nesses casos nunca há dados de demonstração.
+    """
+    try:
+        print(f"Buscando transações para {address}...")
+        
+        if min_timestamp is None:
+            transactions_found, _ = get_tron_transactions(address, limit=limit)
+        else:
+            transactions_found = []
+            fingerprint = None
+            for _ in range(SYNC_MAX_PAGES):
+                page, fingerprint = get_tron_transactions(
+                    address,
+                    limit=limit,
+                    min_timestamp=min_timestamp,
+                    fingerprint=fingerprint,
+                    order_by='block_timestamp,asc'
+                )
+                transactions_found.extend(page)
+                if not fingerprint:
+                    break
+        
+        print(f"API Tron funcionou! {len(transactions_found)} transações encontradas")
+        return transactions_found, 'trongrid'
+        
+    except (CircuitOpenError, RateLimitedError):
+        # Sem dados de demonstração: a carteira fica para a próxima varredura
+        raise
+    except TronAPIError as e:
+        print(f"Erro na API Tron: {e}, usando dados de demonstração...")
+    
+    # Fallback: dados de demonstração realistas
+    return get_demo_transactions(address), 'demo'
+
+class ResponseCache:
+    """LRU de corpos JSON já serializados, limitado em entradas e em bytes
+
+    A chave inclui a versão dos dados, por isso nunca é preciso invalidar:
+    entradas de versões antigas deixam de ser pedidas e saem pelo fim da fila.
+    """
+    
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Retornar (corpo, Content-Encoding) ou None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key, body, content_encoding=None):
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key)[0])
+            self._entries[key] = (body, content_encoding)
+            self._size += size
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+response_cache = ResponseCache()
+
+# Distingue ETags de arranques diferentes (p. ex. depois de apagar o banco)
+INSTANCE_ID = os.urandom(4).hex()
+
+def cached_json_response(version, compute):
+    """Responder a um GET de leitura com ETag, 304 e cache de respostas
+
+    `version` deve ser lida antes dos dados (ver data_version), para que o
+    conteúdo guardado seja sempre pelo menos tão recente como a versão.
+    `compute()` só é chamada quando a resposta não está em cache; o corpo
+    fica guardado já comprimido quando o cliente aceita gzip.
+    """
+    etag = f'{INSTANCE_ID}-{version}'
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        key = (request.path, request.query_string, version, accepts_gzip())
+        entry = response_cache.get(key)
+        if entry is None:
+            entry = compress_json_body(jsonify(compute()).get_data())
+            response_cache.put(key, *entry)
+        body, content_encoding = entry
+        response = Response(body, mimetype='application/json')
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+    
+    # ETag fraca: a mesma versão serve em gzip ou sem compressão
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    # O browser guarda a resposta mas revalida sempre com If-None-Match
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def accepts_gzip():
+    return request.accept_encodings['gzip'] > 0
+
+def compress_json_body(body):
+    """Retornar (corpo, Content-Encoding), comprimido se for grande e o cliente aceitar gzip"""
+    if len(body) >= COMPRESS_MIN_BYTES and accepts_gzip():
+        return gzip.compress(body, GZIP_LEVEL), 'gzip'
+    return body, None
+
+@app.after_request
+def compress_json_response(response):
+    """Comprimir as respostas JSON grandes que não passaram por cached_json_response
+
+    Respostas em streaming (eventos SSE, exportação) ficam como estão.
+    """
+    if (response.mimetype != 'application/json' or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers):
+        return response
+    
+    body, content_encoding = compress_json_body(response.get_data())
+    if content_encoding:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = content_encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/api/wallets', methods=['GET'])
 def get_wallets():
     """Listar todas as carteiras"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM wallets WHERE is_active = 1')
-        wallets = cursor.fetchall()
-        conn.close()
-        
-        wallet_list = []
-        for wallet in wallets:
-            wallet_list.append({
-                'id': wallet[0],
-                'address': wallet[1],
-                'name': wallet[2],
-                'created_at': wallet[3],
-                'is_active': wallet[4]
-            })
+        conn = get_db()
         
-        return jsonify(wallet_list)
+        def compute():
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM wallets WHERE is_active = 1')
+            wallets = cursor.fetchall()
+            
+            wallet_list = []
+            for wallet in wallets:
+                wallet_list.append({
+                    'id': wallet[0],
+                    'address': wallet[1],
+                    'name': wallet[2],
+                    'created_at': wallet[3],
+                    'is_active': wallet[4]
+                })
+            return wallet_list
+        
+        return cached_json_response(data_version(conn, 'wallets_version'), compute)
     except Exception as e:
         return jsonify({'error': f'Erro ao buscar carteiras: {str(e)}'}), 500
 
@@ -170,21 +1511,10 @@ def add_wallet():
         if not name:
             name = f"Carteira {address[:8]}..."
         
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        
-        # Verificar se já existe
-        cursor.execute('SELECT id FROM wallets WHERE address = ? AND is_active = 1', (address,))
-        if cursor.fetchone():
-            conn.close()
+        wallet_id = db_writer.execute(_insert_wallet, address, name)
+        if wallet_id is None:
             return jsonify({'error': 'Esta carteira já foi adicionada'}), 400
         
-        # Inserir nova carteira
-        cursor.execute('INSERT INTO wallets (address, name) VALUES (?, ?)', (address, name))
-        wallet_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
         return jsonify({
             'message': 'Carteira adicionada com sucesso!',
             'wallet': {
@@ -194,1167 +1524,2377 @@ def add_wallet():
             }
         })
         
+    except WriterBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+def _insert_wallet(cursor, address, name):
+    """Inserir a carteira e retornar o seu id, ou None se já estiver ativa"""
+    # A verificação corre no escritor, por isso dois pedidos iguais não passam os dois
+    cursor.execute('SELECT id FROM wallets WHERE address = ? AND is_active = 1', (address,))
+    if cursor.fetchone():
+        return None
+    
+    cursor.execute('INSERT INTO wallets (address, name) VALUES (?, ?)', (address, name))
+    wallet_id = cursor.lastrowid
+    bump_data_version(cursor, 'wallets_version')
+    return wallet_id
+
+def _deactivate_wallet(cursor, wallet_id):
+    cursor.execute('UPDATE wallets SET is_active = 0 WHERE id = ?', (wallet_id,))
+    bump_data_version(cursor, 'wallets_version')
+
 @app.route('/api/wallets/<int:wallet_id>', methods=['DELETE'])
 def remove_wallet(wallet_id):
     """Remover carteira"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE wallets SET is_active = 0 WHERE id = ?', (wallet_id,))
-        conn.commit()
-        conn.close()
+        db_writer.execute(_deactivate_wallet, wallet_id)
         
         return jsonify({'message': 'Carteira removida com sucesso!'})
+    except WriterBusyError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-@app.route('/api/monitor', methods=['POST'])
-def monitor_transactions():
-    """Monitorizar transações de todas as carteiras ativas"""
-    try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM wallets WHERE is_active = 1')
-        wallets = cursor.fetchall()
-        
-        if not wallets:
-            conn.close()
-            return jsonify({'error': 'Nenhuma carteira adicionada para monitorizar'}), 400
-        
-        print("Iniciando monitorização...")
-        
-        new_transactions = 0
-        total_found = 0
-        
-        for wallet in wallets:
-            wallet_id, address, name = wallet[0], wallet[1], wallet[2]
-            print(f"Monitorando carteira: {address}")
-            
-            # Buscar transações (API real + fallback)
-            found_transactions = get_tron_transactions_with_fallback(address)
-            total_found += len(found_transactions)
-            
-            for tx_data in found_transactions:
-                # Verificar se já existe
-                cursor.execute('SELECT id FROM transactions WHERE hash = ?', (tx_data['hash'],))
-                if not cursor.fetchone():
-                    # Inserir nova transação
-                    cursor.execute('''
-                        INSERT INTO transactions 
-                        (hash, from_address, to_address, amount, timestamp, type, block_number, wallet_id)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        tx_data['hash'],
-                        tx_data['from_address'],
-                        tx_data['to_address'],
-                        tx_data['amount'],
-                        tx_data['timestamp'],
-                        tx_data['type'],
-                        tx_data.get('block_number', 0),
-                        wallet_id
-                    ))
-                    new_transactions += 1
-                    print(f"Nova transação: {tx_data['amount']} USDT ({tx_data['type']})")
-        
-        conn.commit()
-        
-        # Contar total de transações
-        cursor.execute('SELECT COUNT(*) FROM transactions')
-        total_transactions = cursor.fetchone()[0]
-        conn.close()
-        
-        message = f"Monitorização concluída! {new_transactions} novas transações encontradas."
-        if new_transactions > 0:
-            message = f"✅ {new_transactions} novas transações encontradas! Total: {total_transactions}"
-        
-        return jsonify({
-            'message': message,
-            'transactions_found': total_transactions,
-            'new_transactions': new_transactions,
-            'wallets_monitored': len(wallets)
-        })
-        
-    except Exception as e:
-        print(f"Erro na monitorização: {e}")
-        return jsonify({'error': f'Erro na monitorização: {str(e)}'}), 500
+class EventSubscription:
+    """Fila limitada de mensagens SSE de um cliente
 
-@app.route('/api/transactions', methods=['GET'])
-def get_all_transactions():
-    """Listar todas as transações"""
-    try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM transactions ORDER BY timestamp DESC')
-        transactions = cursor.fetchall()
-        conn.close()
-        
-        transaction_list = []
-        for tx in transactions:
-            transaction_list.append({
-                'id': tx[0],
-                'hash': tx[1],
-                'from_address': tx[2],
-                'to_address': tx[3],
-                'amount': tx[4],
-                'timestamp': tx[5],
-                'type': tx[6],
-                'block_number': tx[7],
-                'wallet_id': tx[8],
-                'note': tx[9],
-                'is_completed': tx[10]
-            })
+    Eventos com `coalesce_key` substituem o anterior com a mesma chave ainda
+    por entregar (p. ex. o progresso da varredura). Se a fila encher, o
+    cliente está atrasado: as mensagens pendentes são descartadas e recebe
+    um único evento `resync`, para voltar a sincronizar por /api/changes.
+    """
+    
+    def __init__(self, buffer_size=SSE_CLIENT_BUFFER):
+        self.buffer_size = buffer_size
+        self.overflows = 0
+        self._pending = []
+        self._overflowed = False
+        self._ready = threading.Condition()
+    
+    def push(self, message, coalesce_key=None):
+        with self._ready:
+            if coalesce_key is not None:
+                # Manter a ordem: o evento substituído sai e o novo entra no fim
+                self._pending = [entry for entry in self._pending if entry[0] != coalesce_key]
+            if len(self._pending) >= self.buffer_size:
+                self._pending.clear()
+                self._overflowed = True
+                self.overflows += 1
+                # Acordar já o cliente para receber o resync, sem esperar pelo keepalive
+                self._ready.notify()
+                return
+            self._pending.append((coalesce_key, message))
+            self._ready.notify()
+    
+    def wait(self, timeout):
+        """Esperar até `timeout` segundos e retornar as mensagens pendentes"""
+        with self._ready:
+            self._ready.wait_for(lambda: self._pending or self._overflowed, timeout)
+            messages = [message for _, message in self._pending]
+            if self._overflowed:
+                messages = [format_sse_event('resync', {})] + messages
+            self._pending.clear()
+            self._overflowed = False
+            return messages
+
+def format_sse_event(event, data, event_id=None):
+    lines = [f'event: {event}', f'data: {json.dumps(data)}']
+    if event_id is not None:
+        lines.insert(0, f'id: {event_id}')
+    return '\n'.join(lines) + '\n\n'
+
+class EventBroadcaster:
+    """Distribuição em processo dos eventos de ingestão para os clientes SSE
+
+    Cada evento é serializado uma única vez e a mesma string é colocada na
+    fila de cada cliente; sem clientes ligados, publicar não custa nada.
+    """
+    
+    def __init__(self, max_clients=SSE_MAX_CLIENTS, buffer_size=SSE_CLIENT_BUFFER):
+        self.max_clients = max_clients
+        self.buffer_size = buffer_size
+        self.published = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+    
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise TooManySubscribersError('Demasiados clientes ligados ao canal de eventos')
+            subscription = EventSubscription(self.buffer_size)
+            self._subscribers.add(subscription)
+            return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+    
+    def publish(self, event, data, coalesce_key=None):
+        with self._lock:
+            if not self._subscribers:
+                return
+            self.published += 1
+            message = format_sse_event(event, data, self.published)
+            subscribers = list(self._subscribers)
         
-        return jsonify(transaction_list)
-    except Exception as e:
-        return jsonify({'error': f'Erro ao buscar transações: {str(e)}'}), 500
+        for subscription in subscribers:
+            subscription.push(message, coalesce_key)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self._subscribers),
+                'published': self.published,
+                'overflows': sum(subscription.overflows for subscription in self._subscribers)
+            }
 
-@app.route('/api/transactions/outgoing', methods=['GET'])
-def get_outgoing_transactions():
-    """Listar transações de saída"""
-    try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM transactions WHERE type = "outgoing" ORDER BY timestamp DESC')
-        transactions = cursor.fetchall()
-        conn.close()
-        
-        transaction_list = []
-        for tx in transactions:
-            transaction_list.append({
-                'id': tx[0],
-                'hash': tx[1],
-                'from_address': tx[2],
-                'to_address': tx[3],
-                'amount': tx[4],
-                'timestamp': tx[5],
-                'type': tx[6],
-                'block_number': tx[7],
-                'wallet_id': tx[8],
-                'note': tx[9],
-                'is_completed': tx[10]
-            })
-        
-        return jsonify(transaction_list)
-    except Exception as e:
-        return jsonify({'error': f'Erro ao buscar transações de saída: {str(e)}'}), 500
+events = EventBroadcaster()
 
-@app.route('/api/transactions/incoming', methods=['GET'])
-def get_incoming_transactions():
-    """Listar transações de entrada"""
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Canal Server-Sent Events: transações novas, duplicados e progresso das varreduras"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM transactions WHERE type = "incoming" ORDER BY timestamp DESC')
-        transactions = cursor.fetchall()
-        conn.close()
-        
-        transaction_list = []
-        for tx in transactions:
-            transaction_list.append({
-                'id': tx[0],
-                'hash': tx[1],
-                'from_address': tx[2],
-                'to_address': tx[3],
-                'amount': tx[4],
-                'timestamp': tx[5],
-                'type': tx[6],
-                'block_number': tx[7],
-                'wallet_id': tx[8],
-                'note': tx[9],
-                'is_completed': tx[10]
-            })
-        
-        return jsonify(transaction_list)
-    except Exception as e:
-        return jsonify({'error': f'Erro ao buscar transações de entrada: {str(e)}'}), 500
+        subscription = events.subscribe()
+    except TooManySubscribersError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    try:
+        seq = current_change_seq(get_db())
+    except Exception:
+        events.unsubscribe(subscription)
+        raise
+    
+    def generate():
+        try:
+            # O cliente compara `seq` com o seu e recupera o que perdeu enquanto esteve desligado
+            yield 'retry: 5000\n' + format_sse_event('hello', {'seq': seq})
+            while True:
+                messages = subscription.wait(SSE_KEEPALIVE)
+                yield ''.join(messages) if messages else ': keepalive\n\n'
+        finally:
+            events.unsubscribe(subscription)
+    
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# Varreduras ao vivo em curso; o backfill espera que cheguem a zero antes de cada página
+_live_sweeps = 0
+_live_sweeps_idle = threading.Condition()
+
+def _begin_live_sweep():
+    global _live_sweeps
+    with _live_sweeps_idle:
+        _live_sweeps += 1
+
+def _end_live_sweep():
+    global _live_sweeps
+    with _live_sweeps_idle:
+        _live_sweeps -= 1
+        if _live_sweeps == 0:
+            _live_sweeps_idle.notify_all()
+
+def wait_for_live_sweeps():
+    """Bloquear enquanto houver uma varredura ao vivo em curso"""
+    with _live_sweeps_idle:
+        _live_sweeps_idle.wait_for(lambda: _live_sweeps == 0)
+
+def fetch_wallet_transactions(wallet_id, address, last_block_timestamp=None):
+    """Buscar transações de uma carteira a partir do seu cursor, medindo o tempo gasto"""
+    started = time.monotonic()
+    transactions, source = get_tron_transactions_with_fallback(
+        address,
+        limit=SYNC_PAGE_SIZE,
+        min_timestamp=last_block_timestamp
+    )
+    return {
+        'wallet_id': wallet_id,
+        'address': address,
+        'transactions': transactions,
+        'source': source,
+        'elapsed_ms': int((time.monotonic() - started) * 1000)
+    }
+
+def submit_ingest(wallet_id, transactions, advance_cursor=True, checkpoint=None):
+    """Entregar um lote de transações ao escritor sem esperar pelo commit
+
+    Retorna um Future com o número de transações novas. Usa executemany com
+    INSERT ... ON CONFLICT(hash) DO NOTHING, por isso transações já conhecidas
+    custam apenas a verificação do índice único. As saídas novas são
+    comparadas com a janela de duplicados à sua volta. Na mesma operação
+    avança o cursor de sincronização da carteira (se advance_cursor) e chama
+    checkpoint(cursor, inseridas), usado pelo backfill para gravar o seu
+    progresso de forma atómica com os dados. Quem entrega vários lotes
+    seguidos deixa o escritor gravá-los na mesma transação.
+    """
+    write = db_writer.submit(_ingest_batch, wallet_id, transactions, advance_cursor, checkpoint)
+    result = Future()
+    result.set_running_or_notify_cancel()
+    
+    def written(write):
+        try:
+            batch_result = write.result()
+        except Exception as e:
+            result.set_exception(e)
+            return
+        result.set_result(report_ingest(wallet_id, batch_result))
+    
+    write.add_done_callback(written)
+    return result
+
+def report_ingest(wallet_id, batch_result):
+    """Depois do commit: registar e publicar um lote gravado por _ingest_batch"""
+    inserted, seq, new_rows, flagged_ids = batch_result
+    if inserted:
+        print(f"{inserted} nova(s) transação(ões) gravada(s) para a carteira {wallet_id}")
+        publish_ingest_events(wallet_id, seq, inserted, new_rows, flagged_ids)
+    return inserted
+
+def _ingest_batch(cursor, wallet_id, transactions, advance_cursor, checkpoint):
+    inserted = 0
+    new_rows = []
+    flagged_ids = []
+    if transactions:
+        first_new_id = cursor.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM transactions').fetchone()[0]
+        rows = [
+            (
+                tx_data['hash'],
+                tx_data['from_address'],
+                tx_data['to_address'],
+                tx_data['amount_units'],
+                tx_data['timestamp'],
+                tx_data['type'],
+                tx_data.get('block_number', 0),
+                wallet_id
+            )
+            for tx_data in transactions
+        ]
+        cursor.executemany('''
+            INSERT INTO transactions 
+            (hash, from_address, to_address, amount_units, timestamp, type, block_number, wallet_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(hash) DO NOTHING
+        ''', rows)
+        inserted = cursor.rowcount
+        if inserted:
+            # Números de sequência só para as linhas inseridas: uma página só com
+            # transações já conhecidas não avança a versão dos dados (ETag/cache)
+            new_ids = [row[0] for row in cursor.execute(
+                'SELECT id FROM transactions WHERE id >= ? ORDER BY id', (first_new_id,)
+            )]
+            first_seq = next_change_seq(cursor, len(new_ids))
+            cursor.executemany(
+                'UPDATE transactions SET updated_seq = ? WHERE id = ?',
+                [(first_seq + index, transaction_id) for index, transaction_id in enumerate(new_ids)]
+            )
+            flagged_ids = detect_new_duplicates(cursor, first_new_id)
+            new_rows = cursor.execute(
+                'SELECT * FROM transactions WHERE id >= ? ORDER BY id LIMIT ?',
+                (first_new_id, SSE_MAX_EVENT_TRANSACTIONS)
+            ).fetchall()
+    
+    if advance_cursor:
+        update_sync_cursor(cursor, wallet_id, transactions)
+    if checkpoint is not None:
+        checkpoint(cursor, inserted)
+    
+    return inserted, current_change_seq(cursor), new_rows, flagged_ids
+
+def publish_ingest_events(wallet_id, seq, inserted, new_rows, flagged_ids):
+    """Avisar os clientes SSE depois do commit de um lote"""
+    events.publish('transactions', {
+        'wallet_id': wallet_id,
+        'seq': seq,
+        'count': inserted,
+        'transactions': [transaction_to_dict(tx) for tx in new_rows],
+        'truncated': inserted > len(new_rows)
+    })
+    if flagged_ids:
+        events.publish('duplicates', {
+            'seq': seq,
+            'count': len(flagged_ids),
+            'transaction_ids': flagged_ids
+        })
 
-@app.route('/api/duplicates', methods=['GET'])
-def get_duplicate_transactions():
-    """Listar transações duplicadas"""
+def update_sync_cursor(cursor, wallet_id, transactions):
+    """Avançar a marca d'água da carteira para o bloco mais recente recebido da TronGrid"""
+    if not transactions:
+        return None
+    
+    latest = max(transactions, key=lambda tx: tx['timestamp'])
+    cursor.execute('''
+        INSERT INTO wallet_sync_state (wallet_id, last_block_timestamp, last_tx_hash, last_synced_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(wallet_id) DO UPDATE SET
+            last_block_timestamp = excluded.last_block_timestamp,
+            last_tx_hash = excluded.last_tx_hash,
+            last_synced_at = excluded.last_synced_at
+        WHERE excluded.last_block_timestamp >= wallet_sync_state.last_block_timestamp
+    ''', (wallet_id, latest['timestamp'], latest['hash']))
+    return latest['timestamp']
+
+def run_monitor_sweep(wallets):
+    """Buscar transações das carteiras em paralelo e gravar cada uma pelo escritor do banco
+
+    As consultas à TronGrid correm num pool de threads limitado por
+    FETCH_CONCURRENCY; a thread que chamou esta função entrega cada carteira
+    ao db_writer à medida que termina. Cada carteira é tuplo
+    (id, endereço, last_block_timestamp) e só pede dados a partir do seu cursor.
+    """
+    _begin_live_sweep()
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM transactions WHERE type = "outgoing" ORDER BY timestamp DESC')
-        outgoing_transactions = cursor.fetchall()
-        conn.close()
-        
-        duplicates = []
-        
-        for i, tx1 in enumerate(outgoing_transactions):
-            for j, tx2 in enumerate(outgoing_transactions):
-                if i != j and tx1[4] == tx2[4]:  # mesmo valor
-                    # Verificar proximidade temporal (1 hora = 3600000 ms)
-                    time_diff = abs(tx1[5] - tx2[5])
-                    if time_diff <= 3600000:
-                        tx1_dict = {
-                            'id': tx1[0],
-                            'hash': tx1[1],
-                            'from_address': tx1[2],
-                            'to_address': tx1[3],
-                            'amount': tx1[4],
-                            'timestamp': tx1[5],
-                            'type': tx1[6],
-                            'block_number': tx1[7],
-                            'wallet_id': tx1[8],
-                            'note': tx1[9],
-                            'is_completed': tx1[10]
-                        }
-                        if tx1_dict not in duplicates:
-                            duplicates.append(tx1_dict)
-        
-        return jsonify(duplicates)
-    except Exception as e:
-        return jsonify({'error': f'Erro ao buscar duplicados: {str(e)}'}), 500
-
-@app.route('/api/transactions/<int:transaction_id>/note', methods=['PUT'])
-def update_transaction_note(transaction_id):
-    """Atualizar nota da transação"""
-    try:
-        data = request.get_json()
-        note = data.get('note', '').strip()
-        
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE transactions SET note = ? WHERE id = ?', (note, transaction_id))
-        conn.commit()
-        conn.close()
+        return _run_monitor_sweep(wallets)
+    finally:
+        _end_live_sweep()
+
+def _run_monitor_sweep(wallets):
+    started = time.monotonic()
+    total_found = 0
+    wallets_skipped = 0
+    wallet_timings = []
+    # Escritas entregues ao db_writer sem esperar: (entrada de wallet_timings, Future)
+    pending_writes = []
+    
+    def written_so_far():
+        return sum(
+            write.result() for _, write in pending_writes
+            if write.done() and write.exception() is None
+        )
+    
+    publish_sweep_progress('started', len(wallets), 0, 0)
+    
+    max_workers = max(1, min(FETCH_CONCURRENCY, len(wallets)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tron-fetch') as executor:
+        futures = {
+            executor.submit(fetch_wallet_transactions, wallet[0], wallet[1], wallet[2]): wallet
+            for wallet in wallets
+        }
         
-        return jsonify({'message': 'Nota atualizada com sucesso!'})
-    except Exception as e:
-        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
-
-@app.route('/api/transactions/<int:transaction_id>/complete', methods=['PUT'])
-def toggle_transaction_complete(transaction_id):
-    """Marcar/desmarcar transação como completa"""
+        for future in as_completed(futures):
+            wallet_id, address = futures[future][0], futures[future][1]
+            try:
+                result = future.result()
+            except (CircuitOpenError, RateLimitedError) as e:
+                # O cursor não avança: a carteira é retomada na próxima varredura
+                wallets_skipped += 1
+                wallet_timings.append({
+                    'wallet_id': wallet_id,
+                    'address': address,
+                    'elapsed_ms': None,
+                    'transactions_found': 0,
+                    'new_transactions': 0,
+                    'skipped': True,
+                    'error': str(e)
+                })
+                publish_sweep_progress('running', len(wallets), len(wallet_timings), written_so_far())
+                continue
+            except Exception as e:
+                print(f"Erro ao monitorar carteira {address}: {e}")
+                wallet_timings.append({
+                    'wallet_id': wallet_id,
+                    'address': address,
+                    'elapsed_ms': None,
+                    'transactions_found': 0,
+                    'new_transactions': 0,
+                    'error': str(e)
+                })
+                publish_sweep_progress('running', len(wallets), len(wallet_timings), written_so_far())
+                continue
+            
+            found_transactions = result['transactions']
+            total_found += len(found_transactions)
+            # Dados de demonstração nunca avançam o cursor
+            write = submit_ingest(
+                wallet_id, found_transactions,
+                advance_cursor=result['source'] == 'trongrid'
+            )
+            timing = {
+                'wallet_id': wallet_id,
+                'address': address,
+                'elapsed_ms': result['elapsed_ms'],
+                'transactions_found': len(found_transactions),
+                'new_transactions': 0,
+                'source': result['source']
+            }
+            wallet_timings.append(timing)
+            pending_writes.append((timing, write))
+            publish_sweep_progress('running', len(wallets), len(wallet_timings), written_so_far())
+    
+    # As carteiras que terminaram juntas foram gravadas nos mesmos lotes; esperar por todas
+    new_transactions = 0
+    for timing, write in pending_writes:
+        try:
+            timing['new_transactions'] = db_writer.wait(write)
+        except Exception as e:
+            print(f"Erro ao gravar transações da carteira {timing['address']}: {e}")
+            timing['error'] = str(e)
+            continue
+        new_transactions += timing['new_transactions']
+    
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    publish_sweep_progress('finished', len(wallets), len(wallet_timings), new_transactions, elapsed_ms)
+    if wallets_skipped:
+        print(f"{wallets_skipped} carteira(s) adiada(s): TronGrid indisponível ou limitada")
+    return {
+        'new_transactions': new_transactions,
+        'total_found': total_found,
+        'wallets_skipped': wallets_skipped,
+        'wallet_timings': wallet_timings,
+        'elapsed_ms': elapsed_ms
+    }
+
+def publish_sweep_progress(phase, wallets_total, wallets_done, new_transactions, elapsed_ms=None):
+    # Só o estado mais recente interessa: substitui o progresso ainda não entregue
+    events.publish('sweep', {
+        'phase': phase,
+        'wallets_total': wallets_total,
+        'wallets_done': wallets_done,
+        'new_transactions': new_transactions,
+        'elapsed_ms': elapsed_ms
+    }, coalesce_key='sweep')
+
+class WatchedAddresses:
+    """Endereços das carteiras ativas em memória, indexados em hexadecimal
+
+    Recarregado da tabela wallets apenas quando wallets_version muda.
+    """
+    
+    def __init__(self):
+        self.version = None
+        self.by_hex = {}
+        self._lock = threading.Lock()
+    
+    def refresh(self, conn):
+        version = data_version(conn, 'wallets_version')
+        with self._lock:
+            if version != self.version:
+                by_hex = {}
+                for wallet_id, address in conn.execute('SELECT id, address FROM wallets WHERE is_active = 1'):
+                    try:
+                        by_hex[tron_address_to_hex(address)] = (wallet_id, address)
+                    except ValueError as e:
+                        print(f"Carteira {wallet_id} ignorada na leitura de eventos: {e}")
+                self.by_hex = by_hex
+                self.version = version
+            return self.by_hex
+
+watched_addresses = WatchedAddresses()
+
+def _ingest_event_page(cursor, by_wallet, scan_timestamp):
+    """Gravar as transações de uma página de eventos e avançar o cursor, numa só operação"""
+    results = {
+        wallet_id: _ingest_batch(cursor, wallet_id, transactions, True, None)
+        for wallet_id, transactions in by_wallet.items()
+    }
+    # Sem fingerprint a próxima passagem recomeça aqui; repetidos são ignorados na inserção
+    set_setting(cursor, 'event_scan_timestamp', scan_timestamp)
+    return results
+
+def run_event_scan(conn, max_pages=None):
+    """Ingerir os eventos Transfer do contrato USDT desde o último cursor
+
+    Percorre a TronGrid uma vez para todas as carteiras, por isso o custo
+    depende da atividade na rede e não do número de carteiras vigiadas. O
+    cursor (app_settings.event_scan_timestamp) avança página a página; com
+    o circuito da TronGrid aberto a passagem para e retoma no ciclo seguinte.
+    """
+    _begin_live_sweep()
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('SELECT is_completed FROM transactions WHERE id = ?', (transaction_id,))
-        result = cursor.fetchone()
+        return _run_event_scan(conn, EVENT_SCAN_MAX_PAGES if max_pages is None else max_pages)
+    finally:
+        _end_live_sweep()
+
+def _run_event_scan(conn, max_pages):
+    started = time.monotonic()
+    watched = watched_addresses.refresh(conn)
+    min_timestamp = int(get_setting(conn, 'event_scan_timestamp', 0)) or (
+        int(time.time() * 1000) - EVENT_SCAN_LOOKBACK_MS
+    )
+    
+    publish_sweep_progress('started', len(watched), 0, 0)
+    pages = 0
+    events_scanned = 0
+    new_transactions = 0
+    total_found = 0
+    wallets_skipped = 0
+    wallet_counts = {}
+    fingerprint = None
+    # Cada página é gravada (com o cursor) enquanto a seguinte é pedida à TronGrid
+    page_write = None
+    
+    def finish_page_write(write):
+        nonlocal new_transactions
+        for wallet_id, batch_result in db_writer.wait(write).items():
+            inserted = report_ingest(wallet_id, batch_result)
+            found, new = wallet_counts[wallet_id]
+            wallet_counts[wallet_id] = (found, new + inserted)
+            new_transactions += inserted
+    
+    try:
+        while pages < max_pages:
+            page_events, fingerprint = get_contract_transfer_events(min_timestamp, fingerprint)
+            pages += 1
+            events_scanned += len(page_events)
+            
+            by_wallet = match_transfer_events(page_events, watched)
+            for wallet_id, transactions in by_wallet.items():
+                found, new = wallet_counts.get(wallet_id, (0, 0))
+                wallet_counts[wallet_id] = (found + len(transactions), new)
+                total_found += len(transactions)
+            
+            if page_write is not None:
+                write, page_write = page_write, None
+                finish_page_write(write)
+            if page_events:
+                page_write = db_writer.submit(
+                    _ingest_event_page, by_wallet, max(event['block_timestamp'] for event in page_events)
+                )
+            if not fingerprint:
+                break
+    except (CircuitOpenError, RateLimitedError) as e:
+        wallets_skipped = len(watched)
+        print(f"Leitura de eventos interrompida: {e}")
+    finally:
+        if page_write is not None:
+            finish_page_write(page_write)
+    
+    addresses = {wallet_id: address for wallet_id, address in watched.values()}
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    publish_sweep_progress('finished', len(watched), len(watched), new_transactions, elapsed_ms)
+    return {
+        'new_transactions': new_transactions,
+        'total_found': total_found,
+        'wallets_skipped': wallets_skipped,
+        'wallet_timings': [
+            {
+                'wallet_id': wallet_id,
+                'address': addresses.get(wallet_id),
+                'elapsed_ms': None,
+                'transactions_found': found,
+                'new_transactions': new,
+                'source': 'events'
+            }
+            for wallet_id, (found, new) in wallet_counts.items()
+        ],
+        'events_scanned': events_scanned,
+        'pages': pages,
+        'caught_up': fingerprint is None and not wallets_skipped,
+        'elapsed_ms': elapsed_ms
+    }
+
+def _claim_sweep_lease(cursor, owner, ttl_ms):
+    """Ficar com (ou renovar) a concessão da varredura; False se outro processo a tiver"""
+    now = int(time.time() * 1000)
+    row = cursor.execute("SELECT value FROM app_settings WHERE key = 'sweep_lease'").fetchone()
+    if row:
+        holder, expires_at = row[0].split()
+        if holder != owner and int(expires_at) > now:
+            return False
+    set_setting(cursor, 'sweep_lease', f'{owner} {now + ttl_ms}')
+    return True
+
+def _release_sweep_lease(cursor, owner):
+    cursor.execute(
+        "DELETE FROM app_settings WHERE key = 'sweep_lease' AND value LIKE ?",
+        (f'{owner} %',)
+    )
+
+class SweepLease:
+    """Exclusão das varreduras dentro do processo e entre processos
+
+    O lock local ordena as threads deste processo; a concessão é uma linha
+    `sweep_lease` em app_settings, tomada pelo escritor dentro de BEGIN
+    IMMEDIATE, por isso o servidor web e `flask --app main scheduler` nunca
+    varrem ao mesmo tempo. Enquanto a varredura corre uma thread renova a
+    concessão; se o processo morrer, ela expira ao fim de `ttl` segundos.
+    """
+    
+    def __init__(self, ttl=SWEEP_LEASE_TTL, poll_interval=1.0):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.owner = f'{INSTANCE_ID}-{os.getpid()}'
+        self._local = threading.Lock()
+        self._stop_renewing = None
+    
+    def _claim(self):
+        return db_writer.execute(_claim_sweep_lease, self.owner, int(self.ttl * 1000))
+    
+    def acquire(self, blocking=True):
+        if not self._local.acquire(blocking=blocking):
+            return False
+        try:
+            while not self._claim():
+                if not blocking:
+                    self._local.release()
+                    return False
+                time.sleep(self.poll_interval)
+        except BaseException:
+            self._local.release()
+            raise
         
-        if result:
-            new_status = 1 if result[0] == 0 else 0
-            cursor.execute('UPDATE transactions SET is_completed = ? WHERE id = ?', (new_status, transaction_id))
-            conn.commit()
+        stop = self._stop_renewing = threading.Event()
+        threading.Thread(target=self._renew, args=(stop,), name='sweep-lease', daemon=True).start()
+        return True
+    
+    def _renew(self, stop):
+        while not stop.wait(self.ttl / 3):
+            try:
+                if not self._claim():
+                    print("Concessão da varredura perdida para outro processo")
+            except Exception as e:
+                print(f"Erro ao renovar a concessão da varredura: {e}")
+    
+    def release(self):
+        self._stop_renewing.set()
+        try:
+            db_writer.execute(_release_sweep_lease, self.owner)
+        except Exception as e:
+            # A concessão expira sozinha ao fim do prazo
+            print(f"Erro ao libertar a concessão da varredura: {e}")
+        finally:
+            self._local.release()
+    
+    def locked(self):
+        """Há uma varredura em curso neste ou noutro processo"""
+        if self._local.locked():
+            return True
+        with db_pool.connection() as conn:
+            lease = get_setting(conn, 'sweep_lease')
+        return lease is not None and int(lease.split()[1]) > time.time() * 1000
+
+# Garante que nunca correm duas varreduras completas ao mesmo tempo (API, jobs ou agendador,
+# neste processo ou no processo dedicado do agendador)
+sweep_lock = SweepLease()
+
+def monitor_active_wallets(blocking=False, wallet_ids=None):
+    """Executar uma varredura de todas as carteiras ativas, ou só de `wallet_ids`
+
+    Retorna o resumo da varredura, ou None se não houver carteiras. Levanta
+    SweepInProgressError se outra varredura estiver em curso e blocking=False.
+    Uma varredura parcial consulta sempre as carteiras uma a uma, mesmo no
+    modo de eventos, e não conta o total de transações.
+    """
+    if not sweep_lock.acquire(blocking=blocking):
+        raise SweepInProgressError('Já existe uma monitorização em andamento')
+    
+    try:
+        conn = db_pool.acquire()
+        try:
+            query = '''
+                SELECT w.id, w.address, s.last_block_timestamp
+                FROM wallets w
+                LEFT JOIN wallet_sync_state s ON s.wallet_id = w.id
+                WHERE w.is_active = 1
+            '''
+            params = []
+            if wallet_ids is not None:
+                query += f" AND w.id IN ({', '.join('?' for _ in wallet_ids)})"
+                params = list(wallet_ids)
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            wallets = cursor.fetchall()
             
-            status = "completa" if new_status else "pendente"
-            message = f'Transação marcada como {status}!'
-        else:
-            message = 'Transação não encontrada'
+            if not wallets:
+                return None
+            
+            if INGESTION_MODE == 'events' and wallet_ids is None:
+                print(f"Iniciando leitura de eventos do contrato para {len(wallets)} carteira(s)...")
+                sweep = run_event_scan(conn)
+            else:
+                print(f"Iniciando monitorização de {len(wallets)} carteira(s) com até {FETCH_CONCURRENCY} em paralelo...")
+                sweep = run_monitor_sweep(wallets)
+                wallet_poll_queue.record_sweep(sweep['wallet_timings'])
+            
+            if wallet_ids is None:
+                # Contar total de transações
+                cursor.execute('SELECT COUNT(*) FROM transactions')
+                sweep['total_transactions'] = cursor.fetchone()[0]
+            sweep['wallets_monitored'] = len(wallets)
+            return sweep
+        finally:
+            db_pool.release(conn)
+    finally:
+        sweep_lock.release()
+
+def summarize_sweep(sweep):
+    """Resumo de uma varredura para a API (mensagem, contagens e tempos)"""
+    new_transactions = sweep['new_transactions']
+    total_transactions = sweep.get('total_transactions')
+    
+    message = f"Monitorização concluída! {new_transactions} novas transações encontradas."
+    if new_transactions > 0 and total_transactions is not None:
+        message = f"✅ {new_transactions} novas transações encontradas! Total: {total_transactions}"
+    elif new_transactions > 0:
+        message = f"✅ {new_transactions} novas transações encontradas!"
+    if sweep['wallets_skipped']:
+        message += f" ⚠️ TronGrid indisponível ou limitada: {sweep['wallets_skipped']} carteira(s) adiada(s) para a próxima varredura."
+    
+    return {
+        'message': message,
+        'transactions_found': total_transactions,
+        'new_transactions': new_transactions,
+        'wallets_monitored': sweep['wallets_monitored'],
+        'wallets_skipped': sweep['wallets_skipped'],
+        'elapsed_ms': sweep['elapsed_ms'],
+        'wallet_timings': sweep['wallet_timings']
+    }
+
+class MonitorJobQueue:
+    """Varreduras pedidas pela API, corridas uma de cada vez fora do pedido HTTP
+
+    Cada trabalho tem um âmbito: todas as carteiras ('all') ou uma só
+    ('wallet:<id>'). Um pedido para um âmbito que já tem um trabalho na fila
+    ou em curso junta-se a esse trabalho em vez de criar outro. Os trabalhos
+    esperam pelo sweep_lock, por isso também não colidem com o agendador.
+    """
+    
+    def __init__(self, history=MONITOR_JOB_HISTORY):
+        self.history = history
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='monitor-job')
+    
+    def submit(self, wallet_id=None):
+        """Pôr uma varredura na fila; retorna (trabalho, criado)"""
+        scope = 'all' if wallet_id is None else f'wallet:{wallet_id}'
+        with self._lock:
+            job_id = self._active.get(scope)
+            if job_id is not None:
+                job = self._jobs[job_id]
+                job['requests'] += 1
+                return dict(job), False
+            
+            job = {
+                'id': os.urandom(6).hex(),
+                'scope': scope,
+                'wallet_id': wallet_id,
+                'status': 'queued',
+                'requests': 1,
+                'created_at': int(time.time() * 1000),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None
+            }
+            self._jobs[job['id']] = job
+            self._active[scope] = job['id']
+            self._trim()
         
-        conn.close()
-        return jsonify({'message': message})
-    except Exception as e:
-        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
-
-@app.route('/health')
-def health():
-    """Health check"""
-    return jsonify({
-        'status': 'ok',
-        'service': 'USDT TRC20 Monitor',
-        'version': '1.0.0'
-    })
-
-@app.route('/')
-def index():
-    """Servir frontend"""
-    return '''
-<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Monitor USDT TRC20 - Tron</title>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-            color: #333;
-        }
-
-        .container {
-            max-width: 1200px;
-            margin: 0 auto;
-            padding: 20px;
-        }
-
-        .header {
-            text-align: center;
-            color: white;
-            margin-bottom: 30px;
-        }
-
-        .header h1 {
-            font-size: 2.5em;
-            margin-bottom: 10px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 10px;
-        }
-
-        .badge {
-            background: #00ff88;
-            color: #000;
-            padding: 5px 10px;
-            border-radius: 15px;
-            font-size: 0.4em;
-            font-weight: bold;
-            text-transform: uppercase;
-        }
-
-        .header p {
-            font-size: 1.2em;
-            opacity: 0.9;
-        }
-
-        .controls {
-            background: rgba(255, 255, 255, 0.95);
-            border-radius: 15px;
-            padding: 20px;
-            margin-bottom: 20px;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
-            backdrop-filter: blur(10px);
-        }
-
-        .auto-monitor {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-            margin-bottom: 15px;
-        }
-
-        .switch {
-            position: relative;
-            display: inline-block;
-            width: 60px;
-            height: 34px;
-        }
-
-        .switch input {
-            opacity: 0;
-            width: 0;
-            height: 0;
-        }
-
-        .slider {
-            position: absolute;
-            cursor: pointer;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background-color: #ccc;
-            transition: .4s;
-            border-radius: 34px;
-        }
-
-        .slider:before {
-            position: absolute;
-            content: "";
-            height: 26px;
-            width: 26px;
-            left: 4px;
-            bottom: 4px;
-            background-color: white;
-            transition: .4s;
-            border-radius: 50%;
-        }
-
-        input:checked + .slider {
-            background-color: #00ff88;
-        }
-
-        input:checked + .slider:before {
-            transform: translateX(26px);
-        }
-
-        .monitor-btn {
-            background: linear-gradient(45deg, #667eea, #764ba2);
-            color: white;
-            border: none;
-            padding: 15px 30px;
-            border-radius: 25px;
-            font-size: 1.1em;
-            font-weight: bold;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            float: right;
-        }
-
-        .monitor-btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2);
-        }
-
-        .monitor-btn:disabled {
-            opacity: 0.6;
-            cursor: not-allowed;
-            transform: none;
-        }
-
-        .tabs {
-            display: flex;
-            background: rgba(255, 255, 255, 0.95);
-            border-radius: 15px;
-            padding: 5px;
-            margin-bottom: 20px;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
-            backdrop-filter: blur(10px);
-            overflow-x: auto;
-        }
+        self._executor.submit(self._run, job['id'])
+        return dict(job), True
+    
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return None if job is None else dict(job)
+    
+    def _trim(self):
+        # Esquecer os trabalhos terminados mais antigos; os ativos nunca saem
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in ('completed', 'failed')]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+    
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if fields.get('status') in ('completed', 'failed'):
+                self._active.pop(job['scope'], None)
+                self._trim()
+    
+    def _run(self, job_id):
+        with self._lock:
+            wallet_id = self._jobs[job_id]['wallet_id']
+        self._update(job_id, status='running', started_at=int(time.time() * 1000))
+        
+        try:
+            if wallet_id is None:
+                sweep = monitor_active_wallets(blocking=True)
+            else:
+                sweep = monitor_active_wallets(blocking=True, wallet_ids=[wallet_id])
+        except Exception as e:
+            print(f"Erro na monitorização: {e}")
+            self._update(job_id, status='failed', error=str(e), finished_at=int(time.time() * 1000))
+            return
+        
+        if sweep is None:
+            error = 'Nenhuma carteira adicionada para monitorizar' if wallet_id is None else 'Carteira não encontrada'
+            self._update(job_id, status='failed', error=error, finished_at=int(time.time() * 1000))
+            return
+        
+        if wallet_id is not None:
+            # Consulta manual: a carteira volta ao intervalo mínimo do agendador adaptativo
+            with db_pool.connection() as conn:
+                wallet_poll_queue.sync(conn)
+            wallet_poll_queue.reset(wallet_id)
+        
+        self._update(job_id, status='completed', result=summarize_sweep(sweep), finished_at=int(time.time() * 1000))
 
-        .tab {
-            flex: 1;
-            padding: 15px 20px;
-            text-align: center;
-            border: none;
-            background: transparent;
-            cursor: pointer;
-            border-radius: 10px;
-            transition: all 0.3s ease;
-            font-weight: bold;
-            white-space: nowrap;
-            min-width: 120px;
-        }
+monitor_jobs = MonitorJobQueue()
 
-        .tab.active {
-            background: linear-gradient(45deg, #667eea, #764ba2);
-            color: white;
-            transform: translateY(-2px);
-        }
+def monitor_job_response(job, created):
+    message = 'Monitorização agendada' if created else 'Monitorização já em andamento'
+    response = jsonify({'message': message, 'job': job})
+    response.status_code = 202
+    response.headers['Location'] = f"/api/monitor/jobs/{job['id']}"
+    return response
 
-        .content {
-            background: rgba(255, 255, 255, 0.95);
-            border-radius: 15px;
-            padding: 30px;
-            box-shadow: 0 8px 32px rgba(0, 0, 0, 0.1);
-            backdrop-filter: blur(10px);
-            min-height: 400px;
-        }
+@app.route('/api/monitor', methods=['POST'])
+def monitor_transactions():
+    """Pôr na fila a monitorização de todas as carteiras ativas (ou de `wallet_id`)
 
-        .wallet-form {
-            display: grid;
-            grid-template-columns: 1fr 1fr auto;
-            gap: 15px;
-            margin-bottom: 30px;
-        }
+    Responde logo com 202 e o trabalho; o resultado fica em
+    /api/monitor/jobs/<id>. Pedidos repetidos enquanto o trabalho está na
+    fila ou em curso recebem o mesmo trabalho.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'O corpo do pedido deve ser um objeto JSON'}), 400
+        wallet_id = data.get('wallet_id')
+        if wallet_id is not None and (isinstance(wallet_id, bool) or not isinstance(wallet_id, int)):
+            return jsonify({'error': 'wallet_id deve ser um inteiro'}), 400
+        
+        cursor = get_db().cursor()
+        if wallet_id is None:
+            cursor.execute('SELECT 1 FROM wallets WHERE is_active = 1 LIMIT 1')
+            if cursor.fetchone() is None:
+                return jsonify({'error': 'Nenhuma carteira adicionada para monitorizar'}), 400
+        else:
+            cursor.execute('SELECT 1 FROM wallets WHERE id = ? AND is_active = 1', (wallet_id,))
+            if cursor.fetchone() is None:
+                return jsonify({'error': 'Carteira não encontrada'}), 404
+        
+        return monitor_job_response(*monitor_jobs.submit(wallet_id))
+    except Exception as e:
+        print(f"Erro na monitorização: {e}")
+        return jsonify({'error': f'Erro na monitorização: {str(e)}'}), 500
 
-        .form-group {
-            display: flex;
-            flex-direction: column;
-        }
+@app.route('/api/monitor/jobs/<job_id>', methods=['GET'])
+def get_monitor_job(job_id):
+    """Consultar o estado e o resultado de um trabalho de monitorização"""
+    job = monitor_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trabalho não encontrado'}), 404
+    return jsonify(job)
+
+class WalletPollQueue:
+    """Próxima consulta de cada carteira numa fila de prioridade (heapq)
+
+    Uma carteira com transações novas volta a ser consultada ao fim de
+    `min_interval` segundos; cada consulta sem novidades multiplica o seu
+    intervalo por `backoff`, até `max_interval`. As entradas do heap que
+    ficaram obsoletas (carteira reagendada ou removida) são ignoradas ao sair.
+    """
+    
+    def __init__(self, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL, backoff=POLL_BACKOFF):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.version = None
+        self._heap = []
+        self._wallets = {}
+        self._lock = threading.Lock()
+    
+    def _schedule(self, wallet_id, interval, delay):
+        next_poll_at = time.time() + delay
+        self._wallets[wallet_id] = (interval, next_poll_at)
+        heapq.heappush(self._heap, (next_poll_at, wallet_id))
+    
+    def sync(self, conn):
+        """Acompanhar as carteiras ativas (só relê a tabela quando wallets_version muda)"""
+        version = data_version(conn, 'wallets_version')
+        with self._lock:
+            if version == self.version:
+                return
+            active = dict(conn.execute('''
+                SELECT w.id, s.last_block_timestamp
+                FROM wallets w
+                LEFT JOIN wallet_sync_state s ON s.wallet_id = w.id
+                WHERE w.is_active = 1
+            ''').fetchall())
+            
+            for wallet_id in list(self._wallets):
+                if wallet_id not in active:
+                    del self._wallets[wallet_id]
+            
+            now = time.time()
+            for wallet_id, last_block_timestamp in active.items():
+                if wallet_id in self._wallets:
+                    continue
+                interval = self.min_interval
+                if last_block_timestamp:
+                    idle = now - last_block_timestamp / 1000
+                    interval = min(self.max_interval, max(self.min_interval, idle / POLL_IDLE_RATIO))
+                # Espalhar as primeiras consultas para não saírem todas ao mesmo tempo
+                self._schedule(wallet_id, interval, random.uniform(0, interval))
+            self.version = version
+    
+    def pop_due(self, limit=POLL_BATCH_SIZE):
+        """Retirar até `limit` carteiras cuja hora de consulta já passou"""
+        now = time.time()
+        due = []
+        with self._lock:
+            while self._heap and len(due) < limit and self._heap[0][0] <= now:
+                next_poll_at, wallet_id = heapq.heappop(self._heap)
+                state = self._wallets.get(wallet_id)
+                if state is None or state[1] != next_poll_at:
+                    continue
+                due.append(wallet_id)
+                # Provisório: se a consulta não chegar a terminar, a carteira volta mais tarde
+                self._schedule(wallet_id, state[0], self.min_interval)
+        return due
+    
+    def record(self, wallet_id, new_transactions, retry_after=None):
+        """Reagendar uma carteira com o resultado da sua última consulta"""
+        with self._lock:
+            state = self._wallets.get(wallet_id)
+            if state is None:
+                return
+            interval = state[0]
+            if retry_after is not None:
+                delay = max(retry_after, self.min_interval)
+            else:
+                if new_transactions:
+                    interval = self.min_interval
+                else:
+                    interval = min(self.max_interval, interval * self.backoff)
+                delay = interval
+            self._schedule(wallet_id, interval, delay * random.uniform(0.9, 1.1))
+    
+    def record_sweep(self, wallet_timings):
+        for timing in wallet_timings:
+            # Falhas mantêm o intervalo; com o circuito aberto esperam pelo próximo teste
+            retry_after = trongrid_client.breaker.retry_in() if timing.get('error') else None
+            self.record(timing['wallet_id'], timing['new_transactions'], retry_after)
+    
+    def reset(self, wallet_id):
+        """Voltar ao intervalo mínimo (p. ex. depois de uma consulta manual)"""
+        with self._lock:
+            if wallet_id in self._wallets:
+                self._schedule(wallet_id, self.min_interval, self.min_interval)
+    
+    def next_delay(self):
+        """Segundos até à próxima carteira a consultar (None com a fila vazia)"""
+        with self._lock:
+            while self._heap:
+                next_poll_at, wallet_id = self._heap[0]
+                state = self._wallets.get(wallet_id)
+                if state is not None and state[1] == next_poll_at:
+                    return max(0.0, next_poll_at - time.time())
+                heapq.heappop(self._heap)
+            return None
+    
+    def status(self, wallet_id):
+        with self._lock:
+            state = self._wallets.get(wallet_id)
+            if state is None:
+                return None
+            return {
+                'interval': round(state[0]),
+                'next_poll_at': int(state[1] * 1000)
+            }
+    
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            intervals = [interval for interval, _ in self._wallets.values()]
+            return {
+                'wallets': len(self._wallets),
+                'due': sum(1 for _, next_poll_at in self._wallets.values() if next_poll_at <= now),
+                'min_interval': self.min_interval,
+                'max_interval': self.max_interval,
+                # Consultas à TronGrid por hora esperadas com os intervalos atuais
+                'polls_per_hour': round(sum(3600 / interval for interval in intervals)),
+                'at_min_interval': sum(1 for interval in intervals if interval <= self.min_interval),
+                'at_max_interval': sum(1 for interval in intervals if interval >= self.max_interval)
+            }
 
-        .form-group label {
-            margin-bottom: 5px;
-            font-weight: bold;
-            color: #555;
-        }
+wallet_poll_queue = WalletPollQueue()
+
+def poll_due_wallets():
+    """Consultar as carteiras cuja vez já chegou; None se nenhuma estiver em atraso"""
+    with db_pool.connection() as conn:
+        wallet_poll_queue.sync(conn)
+    wallet_ids = wallet_poll_queue.pop_due()
+    if not wallet_ids:
+        return None
+    return monitor_active_wallets(wallet_ids=wallet_ids)
+
+class MonitorScheduler:
+    """Laço de monitorização em segundo plano, independente de haver browsers abertos
+
+    Cada ciclo espera `interval` segundos mais uma variação aleatória de até
+    ±`jitter`, e depois corre uma varredura. Se outra varredura (p. ex. um
+    clique em "Monitorizar") estiver em curso, o ciclo é saltado. No modo
+    adaptativo cada ciclo consulta apenas as carteiras em atraso na
+    WalletPollQueue e dorme até à próxima.
+    """
+    
+    def __init__(self, enabled=False, interval=MONITOR_INTERVAL, jitter=MONITOR_JITTER):
+        self.enabled = enabled
+        self.interval = interval
+        self.jitter = jitter
+        self.runs = 0
+        self.skipped = 0
+        self.last_run_at = None
+        self.last_result = None
+        self.last_error = None
+        self.next_run_at = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        """Arrancar a thread do agendador (idempotente)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name='monitor-scheduler', daemon=True)
+            self._thread.start()
+    
+    def configure(self, enabled=None, interval=None, jitter=None):
+        """Alterar a configuração e reiniciar a contagem do próximo ciclo"""
+        with self._lock:
+            if enabled is not None:
+                self.enabled = enabled
+            if interval is not None:
+                self.interval = interval
+            if jitter is not None:
+                self.jitter = jitter
+        self._wake.set()
+    
+    @property
+    def adaptive(self):
+        return ADAPTIVE_POLLING and INGESTION_MODE != 'events'
+    
+    def describe(self):
+        """Ritmo das varreduras em texto, para mensagens (o modo adaptativo ignora intervalo e variação)"""
+        if self.adaptive:
+            return f"adaptativo, cada carteira entre {POLL_MIN_INTERVAL}s e {POLL_MAX_INTERVAL}s"
+        return f"a cada {self.interval}s (±{self.jitter}s)"
+    
+    def status(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'in_process': SCHEDULER_IN_PROCESS,
+                'mode': 'adaptive' if self.adaptive else 'fixed',
+                'running': self._thread is not None and self._thread.is_alive(),
+                'sweep_in_progress': sweep_lock.locked(),
+                'interval': self.interval,
+                'jitter': self.jitter,
+                'runs': self.runs,
+                'skipped': self.skipped,
+                'last_run_at': self.last_run_at,
+                'next_run_at': self.next_run_at,
+                'last_result': self.last_result,
+                'last_error': self.last_error,
+                'poll_queue': wallet_poll_queue.stats() if self.adaptive else None
+            }
+    
+    def _next_delay(self):
+        if self.adaptive:
+            try:
+                with db_pool.connection() as conn:
+                    wallet_poll_queue.sync(conn)
+            except Exception as e:
+                print(f"Agendador: erro ao ler carteiras ativas: {e}")
+            delay = wallet_poll_queue.next_delay()
+            # Acordar pelo menos a cada intervalo mínimo para apanhar carteiras novas
+            return POLL_MIN_INTERVAL if delay is None else min(delay, POLL_MIN_INTERVAL)
+        
+        with self._lock:
+            jitter = min(self.jitter, self.interval)
+            return max(0, self.interval + random.uniform(-jitter, jitter))
+    
+    def _loop(self):
+        while True:
+            if not self.enabled:
+                self.next_run_at = None
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            
+            delay = self._next_delay()
+            self.next_run_at = int((time.time() + delay) * 1000)
+            if self._wake.wait(delay):
+                # Configuração alterada: recalcular o próximo ciclo
+                self._wake.clear()
+                continue
+            
+            self._run_once()
+    
+    def _run_once(self):
+        try:
+            sweep = poll_due_wallets() if self.adaptive else monitor_active_wallets()
+        except SweepInProgressError:
+            with self._lock:
+                self.skipped += 1
+            print("Agendador: monitorização já em andamento, ciclo saltado")
+            return
+        except Exception as e:
+            print(f"Agendador: erro na monitorização: {e}")
+            with self._lock:
+                self.last_error = str(e)
+                self.last_run_at = int(time.time() * 1000)
+            return
+        
+        if sweep is None and self.adaptive:
+            # Nenhuma carteira em atraso: não conta como ciclo
+            return
+        
+        with self._lock:
+            self.runs += 1
+            self.last_run_at = int(time.time() * 1000)
+            self.last_error = None
+            self.last_result = None if sweep is None else {
+                'new_transactions': sweep['new_transactions'],
+                'wallets_monitored': sweep['wallets_monitored'],
+                'wallets_skipped': sweep['wallets_skipped'],
+                'elapsed_ms': sweep['elapsed_ms']
+            }
 
-        .form-group input {
-            padding: 12px;
-            border: 2px solid #e1e5e9;
-            border-radius: 10px;
-            font-size: 1em;
-            transition: border-color 0.3s ease;
-        }
+scheduler = MonitorScheduler(enabled=AUTO_MONITOR)
 
-        .form-group input:focus {
-            outline: none;
-            border-color: #667eea;
-        }
+@app.before_request
+def start_background_services():
+    """Arrancar o agendador no primeiro pedido servido por este processo"""
+    if SCHEDULER_IN_PROCESS:
+        scheduler.start()
 
-        .btn {
-            padding: 12px 25px;
-            border: none;
-            border-radius: 10px;
-            font-weight: bold;
-            cursor: pointer;
-            transition: all 0.3s ease;
-            align-self: end;
-        }
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler_status():
+    """Estado do agendador de monitorização"""
+    return jsonify(scheduler.status())
 
-        .btn-primary {
-            background: linear-gradient(45deg, #00ff88, #00cc6a);
-            color: white;
-        }
+@app.route('/api/scheduler', methods=['PUT'])
+def update_scheduler():
+    """Ativar/desativar o agendador e ajustar intervalo e variação"""
+    if not SCHEDULER_IN_PROCESS:
+        # Este processo não corre o agendador: alterá-lo aqui não teria efeito
+        return jsonify({
+            'error': 'O agendador corre num processo dedicado (flask --app main scheduler); '
+                     'a monitorização automática é controlada nesse processo',
+            'scheduler': scheduler.status()
+        }), 409
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'O corpo do pedido deve ser um objeto JSON'}), 400
+        enabled = data.get('enabled')
+        interval = data.get('interval')
+        jitter = data.get('jitter')
+        
+        if interval is not None:
+            interval = int(interval)
+            if interval < MIN_MONITOR_INTERVAL:
+                return jsonify({'error': f'Intervalo mínimo é {MIN_MONITOR_INTERVAL} segundos'}), 400
+        if jitter is not None:
+            jitter = int(jitter)
+            if jitter < 0:
+                return jsonify({'error': 'Variação não pode ser negativa'}), 400
+        
+        scheduler.configure(
+            enabled=None if enabled is None else bool(enabled),
+            interval=interval,
+            jitter=jitter
+        )
+        
+        status = scheduler.status()
+        state = 'ativada' if status['enabled'] else 'desativada'
+        return jsonify({
+            'message': f"Monitorização automática {state}: {scheduler.describe()}",
+            'scheduler': status
+        })
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Intervalo e variação devem ser números inteiros'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-        .btn-danger {
-            background: linear-gradient(45deg, #ff4757, #ff3742);
-            color: white;
-        }
+def get_backfill_state(conn, wallet_id):
+    """Ler o progresso do backfill de uma carteira (ou None se nunca foi iniciado)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT wallet_id, status, fingerprint, pages_fetched, transactions_found,
+               new_transactions, error, started_at, updated_at
+        FROM wallet_backfill_state WHERE wallet_id = ?
+    ''', (wallet_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    
+    return {
+        'wallet_id': row[0],
+        'status': row[1],
+        'fingerprint': row[2],
+        'pages_fetched': row[3],
+        'transactions_found': row[4],
+        'new_transactions': row[5],
+        'error': row[6],
+        'started_at': row[7],
+        'updated_at': row[8]
+    }
+
+def _start_backfill_state(cursor, wallet_id):
+    cursor.execute('''
+        INSERT OR REPLACE INTO wallet_backfill_state (wallet_id, status)
+        VALUES (?, 'running')
+    ''', (wallet_id,))
 
-        .btn:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2);
-        }
+def _save_backfill_state(cursor, wallet_id, status, fingerprint=None, found=0, inserted=0, pages=0, error=None):
+    cursor.execute('''
+        UPDATE wallet_backfill_state SET
+            status = ?,
+            fingerprint = ?,
+            pages_fetched = pages_fetched + ?,
+            transactions_found = transactions_found + ?,
+            new_transactions = new_transactions + ?,
+            error = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE wallet_id = ?
+    ''', (status, fingerprint, pages, found, inserted, error, wallet_id))
+
+def backfill_wallet(wallet_id, address, restart=False, max_pages=None, page_delay=None):
+    """Percorrer todo o histórico da carteira seguindo o meta.fingerprint da TronGrid
+
+    Cada página é gravada na mesma transação que o fingerprint seguinte, por
+    isso uma execução interrompida retoma exatamente onde parou. A gravação de
+    uma página corre enquanto a seguinte é pedida; só se entrega uma nova
+    depois de a anterior estar confirmada. Antes de cada página o backfill
+    cede a vez a qualquer varredura ao vivo em curso e depois faz uma pausa
+    de `page_delay` segundos. Com `backfill_stop` ligado (encerramento do
+    processo) pára antes da página seguinte e fica 'paused'.
+    """
+    if page_delay is None:
+        page_delay = BACKFILL_PAGE_DELAY
+    
+    # Conexão só para ler o estado: o backfill pode demorar horas e não deve prender uma do pool
+    with db_pool.connection() as conn:
+        state = get_backfill_state(conn, wallet_id)
+    if state is None or restart:
+        db_writer.execute(_start_backfill_state, wallet_id)
+        fingerprint = None
+    elif state['status'] == 'completed':
+        return state
+    else:
+        fingerprint = state['fingerprint']
+        db_writer.execute(_save_backfill_state, wallet_id, 'running', fingerprint)
+    
+    print(f"Backfill da carteira {address} {'retomado' if fingerprint else 'iniciado'}...")
+    pages = 0
+    page_write = None
+    while (max_pages is None or pages < max_pages) and not backfill_stop.is_set():
+        wait_for_live_sweeps()
+        
+        try:
+            transactions, next_fingerprint = get_tron_transactions(
+                address,
+                limit=BACKFILL_PAGE_SIZE,
+                fingerprint=fingerprint
+            )
+        except (CircuitOpenError, RateLimitedError) as e:
+            # Esperar pelo próximo pedido de teste (ou pelo fim da pausa das chaves) e repetir a mesma página
+            retry_in = trongrid_client.breaker.retry_in() if isinstance(e, CircuitOpenError) else 0
+            backfill_stop.wait(max(1.0, retry_in))
+            continue
+        except TronAPIError as e:
+            print(f"Backfill da carteira {address} interrompido: {e}")
+            if page_write is not None:
+                db_writer.wait(page_write)
+                page_write = None
+            db_writer.execute(_save_backfill_state, wallet_id, 'failed', fingerprint, error=str(e))
+            break
+        
+        status = 'running' if next_fingerprint else 'completed'
+        
+        # Valores fixados agora: o checkpoint pode correr depois de o laço avançar
+        def checkpoint(cursor, inserted, status=status, next_fingerprint=next_fingerprint, found=len(transactions)):
+            _save_backfill_state(
+                cursor, wallet_id, status, next_fingerprint,
+                found=found, inserted=inserted, pages=1
+            )
+        
+        # O fingerprint só pode avançar depois de a página anterior estar gravada
+        if page_write is not None:
+            db_writer.wait(page_write)
+        page_write = submit_ingest(wallet_id, transactions, checkpoint=checkpoint)
+        pages += 1
+        
+        if not next_fingerprint:
+            print(f"Backfill da carteira {address} concluído")
+            break
+        fingerprint = next_fingerprint
+        
+        if page_delay:
+            backfill_stop.wait(page_delay)
+    else:
+        if page_write is not None:
+            db_writer.wait(page_write)
+            page_write = None
+        db_writer.execute(_save_backfill_state, wallet_id, 'paused', fingerprint)
+    
+    if page_write is not None:
+        db_writer.wait(page_write)
+    with db_pool.connection() as conn:
+        return get_backfill_state(conn, wallet_id)
+
+# Backfills correm um de cada vez numa thread própria, fora do caminho das varreduras ao vivo.
+# A thread é daemon (um ThreadPoolExecutor seria esperado até ao fim do backfill antes do
+# atexit); no encerramento `backfill_stop` faz o backfill em curso parar na próxima página.
+backfill_stop = threading.Event()
+_backfill_queue = queue.Queue()
+_backfill_thread = None
+_queued_backfills = set()
+_queued_backfills_lock = threading.Lock()
+
+def _backfill_worker():
+    while True:
+        run = _backfill_queue.get()
+        # None acorda a thread no encerramento; os backfills ainda na fila ficam para a próxima vez
+        if run is None or backfill_stop.is_set():
+            return
+        run()
+
+def stop_backfills():
+    """Pedir ao backfill em curso que grave 'paused' e esperar um pouco por ele"""
+    backfill_stop.set()
+    _backfill_queue.put(None)
+    if _backfill_thread is not None:
+        _backfill_thread.join(BACKFILL_STOP_TIMEOUT)
+
+# Registado depois do db_writer: o atexit corre ao contrário, por isso o escritor ainda está aberto
+atexit.register(stop_backfills)
+
+def schedule_backfill(wallet_id, address, restart=False):
+    """Colocar o backfill da carteira na fila; retorna False se já estiver na fila"""
+    global _backfill_thread
+    with _queued_backfills_lock:
+        if wallet_id in _queued_backfills:
+            return False
+        _queued_backfills.add(wallet_id)
+        if _backfill_thread is None:
+            _backfill_thread = threading.Thread(target=_backfill_worker, name='backfill', daemon=True)
+            _backfill_thread.start()
+    
+    def run():
+        try:
+            backfill_wallet(wallet_id, address, restart=restart)
+        except Exception as e:
+            print(f"Erro no backfill da carteira {address}: {e}")
+        finally:
+            with _queued_backfills_lock:
+                _queued_backfills.discard(wallet_id)
+    
+    _backfill_queue.put(run)
+    return True
 
-        .wallet-list {
-            margin-bottom: 30px;
-        }
+@app.route('/api/wallets/<int:wallet_id>/poll', methods=['POST'])
+def poll_wallet(wallet_id):
+    """Consultar já uma carteira, fora do calendário adaptativo
 
-        .wallet-item {
-            background: #f8f9fa;
-            padding: 15px;
-            border-radius: 10px;
-            margin-bottom: 10px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
+    Equivale a POST /api/monitor com `wallet_id`: responde 202 com o trabalho
+    e, no fim, a carteira volta ao intervalo mínimo.
+    """
+    try:
+        cursor = get_db().cursor()
+        cursor.execute('SELECT 1 FROM wallets WHERE id = ? AND is_active = 1', (wallet_id,))
+        if cursor.fetchone() is None:
+            return jsonify({'error': 'Carteira não encontrada'}), 404
+        
+        return monitor_job_response(*monitor_jobs.submit(wallet_id))
+    except Exception as e:
+        return jsonify({'error': f'Erro ao consultar carteira: {str(e)}'}), 500
 
-        .wallet-info h4 {
-            margin-bottom: 5px;
-            color: #333;
-        }
+@app.route('/api/wallets/<int:wallet_id>/backfill', methods=['POST'])
+def start_wallet_backfill(wallet_id):
+    """Iniciar (ou retomar) o backfill do histórico completo da carteira"""
+    try:
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'O corpo do pedido deve ser um objeto JSON'}), 400
+        restart = bool(data.get('restart', False))
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT address FROM wallets WHERE id = ? AND is_active = 1', (wallet_id,))
+        wallet = cursor.fetchone()
+        if not wallet:
+            return jsonify({'error': 'Carteira não encontrada'}), 404
+        
+        state = get_backfill_state(conn, wallet_id)
+        
+        if state and state['status'] == 'completed' and not restart:
+            return jsonify({'message': 'Backfill já concluído para esta carteira', 'backfill': state})
+        
+        if not schedule_backfill(wallet_id, wallet[0], restart=restart):
+            return jsonify({'message': 'Backfill já está em andamento', 'backfill': state}), 202
+        
+        return jsonify({'message': 'Backfill agendado', 'backfill': state}), 202
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-        .wallet-info p {
-            color: #666;
-            font-size: 0.9em;
-        }
+@app.route('/api/wallets/<int:wallet_id>/backfill', methods=['GET'])
+def get_wallet_backfill(wallet_id):
+    """Consultar o progresso do backfill da carteira"""
+    try:
+        conn = get_db()
+        state = get_backfill_state(conn, wallet_id)
+        
+        if state is None:
+            return jsonify({'error': 'Backfill nunca foi iniciado para esta carteira'}), 404
+        
+        with _queued_backfills_lock:
+            state['queued'] = wallet_id in _queued_backfills
+        return jsonify(state)
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-        .transaction-list {
-            max-height: 600px;
-            overflow-y: auto;
-        }
+class InvalidFilterError(ValueError):
+    """Parâmetro de filtro ou de paginação inválido"""
 
-        .transaction-item {
-            background: #f8f9fa;
-            padding: 20px;
-            border-radius: 10px;
-            margin-bottom: 15px;
-            border-left: 5px solid #667eea;
-        }
+def _check_int_range(value, name):
+    """Recusar inteiros que não cabem numa coluna INTEGER do SQLite"""
+    if not SQLITE_INT_MIN <= value <= SQLITE_INT_MAX:
+        raise InvalidFilterError(f'{name} fora do intervalo permitido')
+    return value
 
-        .transaction-item.outgoing {
-            border-left-color: #ff4757;
-        }
+def _parse_time_filter(value, name, end_of_day=False):
+    """Aceitar milissegundos desde a época ou data ISO (AAAA-MM-DD ou AAAA-MM-DDTHH:MM)"""
+    if value.isdecimal():
+        return _check_int_range(int(value), name)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidFilterError(f'{name} deve ser uma data ISO ou timestamp em ms') from None
+    if end_of_day and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59, microsecond=999000)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+def _parse_number_filter(value, name, cast=float):
+    try:
+        return cast(value)
+    except ValueError:
+        raise InvalidFilterError(f'{name} deve ser numérico') from None
 
-        .transaction-item.incoming {
-            border-left-color: #00ff88;
-        }
+def _parse_amount_filter(value, name, rounding):
+    try:
+        return amount_to_units(value, rounding)
+    except ValueError as e:
+        raise InvalidFilterError(f'{name}: {e}') from None
+
+def parse_transaction_filters(args):
+    """Ler os filtros de listagem da query string"""
+    filters = {}
+    if args.get('wallet_id'):
+        filters['wallet_id'] = _check_int_range(
+            _parse_number_filter(args['wallet_id'], 'wallet_id', int), 'wallet_id'
+        )
+    if args.get('from'):
+        filters['from_timestamp'] = _parse_time_filter(args['from'], 'from')
+    if args.get('to'):
+        filters['to_timestamp'] = _parse_time_filter(args['to'], 'to', end_of_day=True)
+    if args.get('min_amount'):
+        # Em unidades base; limites com mais de 6 casas arredondam para dentro do intervalo
+        filters['min_amount'] = _parse_amount_filter(args['min_amount'], 'min_amount', ROUND_CEILING)
+    if args.get('max_amount'):
+        filters['max_amount'] = _parse_amount_filter(args['max_amount'], 'max_amount', ROUND_FLOOR)
+    if args.get('counterparty'):
+        filters['counterparty'] = args['counterparty'].strip()
+    if args.get('completed'):
+        value = args['completed'].lower()
+        if value not in ('true', 'false', '1', '0'):
+            raise InvalidFilterError('completed deve ser true ou false')
+        filters['completed'] = value in ('true', '1')
+    return filters
+
+def build_transaction_filter_sql(filters, tx_type=None):
+    """Construir a cláusula WHERE (e parâmetros) para os filtros de listagem"""
+    clauses = []
+    params = []
+    if tx_type:
+        clauses.append('type = ?')
+        params.append(tx_type)
+    if 'wallet_id' in filters:
+        clauses.append('wallet_id = ?')
+        params.append(filters['wallet_id'])
+    if 'from_timestamp' in filters:
+        clauses.append('timestamp >= ?')
+        params.append(filters['from_timestamp'])
+    if 'to_timestamp' in filters:
+        clauses.append('timestamp <= ?')
+        params.append(filters['to_timestamp'])
+    if 'min_amount' in filters:
+        clauses.append('amount_units >= ?')
+        params.append(filters['min_amount'])
+    if 'max_amount' in filters:
+        clauses.append('amount_units <= ?')
+        params.append(filters['max_amount'])
+    if 'counterparty' in filters:
+        clauses.append('(from_address = ? OR to_address = ?)')
+        params.extend([filters['counterparty'], filters['counterparty']])
+    if 'completed' in filters:
+        clauses.append('is_completed = ?')
+        params.append(1 if filters['completed'] else 0)
+    return clauses, params
+
+def encode_page_cursor(timestamp, transaction_id):
+    return f'{timestamp}.{transaction_id}'
+
+def decode_page_cursor(value):
+    try:
+        timestamp, transaction_id = value.split('.')
+        return (
+            _check_int_range(int(timestamp), 'cursor'),
+            _check_int_range(int(transaction_id), 'cursor'),
+        )
+    except InvalidFilterError:
+        raise
+    except ValueError:
+        raise InvalidFilterError('cursor inválido') from None
 
-        .transaction-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 10px;
-        }
+def parse_page_size(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidFilterError('limit deve ser um número inteiro') from None
+    if limit < 1:
+        raise InvalidFilterError('limit deve ser maior que zero')
+    return min(limit, MAX_PAGE_SIZE)
+
+def fetch_transaction_page(conn, args, tx_type=None):
+    """Uma página de transações por (timestamp, id) decrescente, com filtros
+
+    Paginação por chave (keyset): o cursor é o (timestamp, id) da última linha
+    devolvida, por isso cada página é uma procura no índice e não depende de
+    quantas linhas vieram antes.
+    """
+    filters = parse_transaction_filters(args)
+    limit = parse_page_size(args)
+    clauses, params = build_transaction_filter_sql(filters, tx_type)
+    
+    if args.get('cursor'):
+        clauses.append('(timestamp, id) < (?, ?)')
+        params.extend(decode_page_cursor(args['cursor']))
+    
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT * FROM transactions
+        {where}
+        ORDER BY timestamp DESC, id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_page_cursor(rows[-1][5], rows[-1][0]) if has_more else None
+    
+    return {
+        'transactions': [transaction_to_dict(tx) for tx in rows],
+        'next_cursor': next_cursor,
+        'limit': limit
+    }
 
-        .transaction-amount {
-            font-size: 1.5em;
-            font-weight: bold;
-            color: #333;
-        }
+@app.route('/api/transactions', methods=['GET'])
+def get_all_transactions():
+    """Listar todas as transações (paginado)"""
+    try:
+        conn = get_db()
+        return cached_json_response(
+            data_version(conn, 'change_seq'),
+            lambda: fetch_transaction_page(conn, request.args)
+        )
+    except InvalidFilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro ao buscar transações: {str(e)}'}), 500
 
-        .transaction-type {
-            padding: 5px 10px;
-            border-radius: 15px;
-            font-size: 0.8em;
-            font-weight: bold;
-            text-transform: uppercase;
-        }
+@app.route('/api/transactions/outgoing', methods=['GET'])
+def get_outgoing_transactions():
+    """Listar transações de saída (paginado)"""
+    try:
+        conn = get_db()
+        return cached_json_response(
+            data_version(conn, 'change_seq'),
+            lambda: fetch_transaction_page(conn, request.args, 'outgoing')
+        )
+    except InvalidFilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro ao buscar transações de saída: {str(e)}'}), 500
 
-        .transaction-type.outgoing {
-            background: #ff4757;
-            color: white;
-        }
+@app.route('/api/transactions/incoming', methods=['GET'])
+def get_incoming_transactions():
+    """Listar transações de entrada (paginado)"""
+    try:
+        conn = get_db()
+        return cached_json_response(
+            data_version(conn, 'change_seq'),
+            lambda: fetch_transaction_page(conn, request.args, 'incoming')
+        )
+    except InvalidFilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro ao buscar transações de entrada: {str(e)}'}), 500
 
-        .transaction-type.incoming {
-            background: #00ff88;
-            color: white;
-        }
+EXPORT_FIELDS = [
+    'id', 'hash', 'from_address', 'to_address', 'amount', 'timestamp',
+    'type', 'block_number', 'wallet_id', 'note', 'is_completed'
+]
+# Colunas lidas do banco, pela mesma ordem (o valor é convertido para decimal ao exportar)
+EXPORT_COLUMNS = ['amount_units' if field == 'amount' else field for field in EXPORT_FIELDS]
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv')
+}
+
+def iter_transaction_export(conn, filters, tx_type=None, fmt='ndjson'):
+    """Gerar a exportação em blocos de texto, lendo o cursor com fetchmany
+
+    Só há em memória um bloco de EXPORT_CHUNK_SIZE linhas de cada vez, por
+    isso o consumo é o mesmo para 10 mil ou 10 milhões de transações.
+    """
+    clauses, params = build_transaction_filter_sql(filters, tx_type)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {', '.join(EXPORT_COLUMNS)} FROM transactions
+        {where}
+        ORDER BY timestamp DESC, id DESC
+    ''', params)
+    
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        yield buffer.getvalue()
+    
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows(row[:4] + (format_amount(row[4]),) + row[5:] for row in rows)
+            yield buffer.getvalue()
+        else:
+            yield ''.join(json.dumps(transaction_to_dict(row), ensure_ascii=False) + '\n' for row in rows)
+
+def _parse_export_args(args):
+    fmt = args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise InvalidFilterError('format deve ser ndjson ou csv')
+    tx_type = args.get('type')
+    if tx_type not in (None, '', 'outgoing', 'incoming'):
+        raise InvalidFilterError('type deve ser outgoing ou incoming')
+    return fmt, tx_type or None, parse_transaction_filters(args)
+
+@app.route('/api/transactions/export', methods=['GET'])
+def export_transactions():
+    """Exportar transações em NDJSON ou CSV, em streaming"""
+    try:
+        fmt, tx_type, filters = _parse_export_args(request.args)
+    except InvalidFilterError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        # Conexão própria: o streaming continua depois de a view retornar
+        with db_pool.connection() as conn:
+            yield from iter_transaction_export(conn, filters, tx_type, fmt)
+    
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    filename = f"transacoes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return Response(
+        generate(),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+def transaction_to_dict(tx):
+    """Converter uma linha de `SELECT * FROM transactions` em dicionário da API"""
+    return {
+        'id': tx[0],
+        'hash': tx[1],
+        'from_address': tx[2],
+        'to_address': tx[3],
+        'amount': units_to_amount(tx[4]),
+        'amount_units': tx[4],
+        'timestamp': tx[5],
+        'type': tx[6],
+        'block_number': tx[7],
+        'wallet_id': tx[8],
+        'note': tx[9],
+        'is_completed': tx[10]
+    }
+
+# Saídas com uma vizinha do mesmo valor dentro da janela. Em vez de comparar
+# todos os pares, agrupa por valor e ordena por timestamp: numa sequência
+# ordenada, se existe alguma saída dentro da janela, a vizinha imediata
+# (anterior ou seguinte) também está. Basta olhar para LAG/LEAD, o que dá
+# O(n log n) sobre o índice idx_transactions_outgoing_amount.
+DUPLICATE_NEIGHBOURS_SQL = '''
+    WITH neighbours AS (
+        SELECT id, amount_units, timestamp,
+               LAG(timestamp) OVER same_amount AS previous_timestamp,
+               LEAD(timestamp) OVER same_amount AS next_timestamp
+        FROM transactions INDEXED BY idx_transactions_outgoing_amount
+        WHERE type = 'outgoing'
+        WINDOW same_amount AS (PARTITION BY amount_units ORDER BY timestamp)
+    )
+    SELECT n.id, n.amount_units, n.timestamp FROM neighbours n
+    WHERE n.timestamp - n.previous_timestamp <= :window OR n.next_timestamp - n.timestamp <= :window
+'''
+
+def find_duplicate_transactions(conn, window_ms=None):
+    """Calcular do zero as saídas com outra saída do mesmo valor a até `window_ms`"""
+    if window_ms is None:
+        window_ms = DUPLICATE_WINDOW_MS
+    
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        WITH duplicates AS ({DUPLICATE_NEIGHBOURS_SQL})
+        SELECT t.* FROM duplicates d
+        JOIN transactions t ON t.id = d.id
+        ORDER BY t.timestamp DESC, t.id DESC
+    ''', {'window': window_ms})
+    return [transaction_to_dict(tx) for tx in cursor.fetchall()]
+
+def detect_new_duplicates(cursor, first_new_id, window_ms=None):
+    """Marcar como duplicadas as saídas novas (id >= first_new_id) e as suas parceiras
+
+    Só consulta a janela de ±window_ms à volta de cada saída nova, usando o
+    índice por (valor, timestamp). Deve correr na mesma transação da inserção.
+    Retorna os ids das transações que passaram a estar marcadas.
+    """
+    if window_ms is None:
+        window_ms = DUPLICATE_WINDOW_MS
+    
+    cursor.execute('''
+        WITH pairs AS (
+            SELECT n.id AS new_id, n.amount_units, n.timestamp AS new_timestamp,
+                   o.id AS other_id, o.timestamp AS other_timestamp
+            FROM transactions n
+            JOIN transactions o INDEXED BY idx_transactions_outgoing_amount
+              ON o.type = 'outgoing'
+             AND o.amount_units = n.amount_units
+             AND o.timestamp BETWEEN n.timestamp - :window AND n.timestamp + :window
+             AND o.id != n.id
+            WHERE n.id >= :first_new_id AND n.type = 'outgoing'
+        ),
+        flagged AS (
+            SELECT new_id AS id, amount_units, new_timestamp AS timestamp FROM pairs
+            UNION
+            SELECT other_id, amount_units, other_timestamp FROM pairs
+        )
+        SELECT id, amount_units, timestamp FROM flagged
+        WHERE id NOT IN (SELECT transaction_id FROM suspected_duplicates)
+    ''', {'window': window_ms, 'first_new_id': first_new_id})
+    flagged = cursor.fetchall()
+    if not flagged:
+        return []
+    
+    cursor.executemany('''
+        INSERT INTO suspected_duplicates (transaction_id, amount_units, timestamp) VALUES (?, ?, ?)
+    ''', flagged)
+    
+    # As parceiras antigas mudaram de estado: publicá-las na sequência de alterações
+    first_seq = next_change_seq(cursor, len(flagged))
+    cursor.executemany(
+        'UPDATE transactions SET updated_seq = ? WHERE id = ?',
+        [(first_seq + index, row[0]) for index, row in enumerate(flagged)]
+    )
+    return [row[0] for row in flagged]
+
+def get_setting(conn, key, default=None):
+    row = conn.execute('SELECT value FROM app_settings WHERE key = ?', (key,)).fetchone()
+    return row[0] if row else default
+
+def set_setting(cursor, key, value):
+    cursor.execute('''
+        INSERT INTO app_settings (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (key, str(value)))
 
-        .transaction-details {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 15px;
-            margin-bottom: 15px;
-        }
+def next_change_seq(cursor, count=1):
+    """Reservar `count` números da sequência de alterações e retornar o primeiro
 
-        .transaction-actions {
-            display: flex;
-            gap: 10px;
-            flex-wrap: wrap;
-        }
+    A sequência é monotónica e partilhada por todas as escritas em
+    transações. Deve correr dentro da transação que aplica a alteração.
+    """
+    # UPDATE seguido de SELECT em vez de RETURNING, que só existe desde o SQLite 3.35
+    cursor.execute('''
+        UPDATE app_settings SET value = CAST(value AS INTEGER) + ?
+        WHERE key = 'change_seq'
+    ''', (count,))
+    cursor.execute("SELECT CAST(value AS INTEGER) FROM app_settings WHERE key = 'change_seq'")
+    return cursor.fetchone()[0] - count + 1
 
-        .btn-sm {
-            padding: 8px 15px;
-            font-size: 0.9em;
-        }
+def current_change_seq(conn):
+    return int(get_setting(conn, 'change_seq', 0))
 
-        .notification {
-            position: fixed;
-            top: 20px;
-            right: 20px;
-            padding: 15px 25px;
-            border-radius: 10px;
-            color: white;
-            font-weight: bold;
-            z-index: 1000;
-            transform: translateX(400px);
-            transition: transform 0.3s ease;
-        }
+def bump_data_version(cursor, key):
+    """Incrementar um contador de versão em app_settings (criado a 1 se não existir)"""
+    cursor.execute('''
+        INSERT INTO app_settings (key, value) VALUES (?, '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1
+    ''', (key,))
+
+def data_version(conn, *keys):
+    """Versão barata dos dados de uma listagem: os contadores `keys` de app_settings
+
+    change_seq avança com qualquer escrita em transações ou duplicados e
+    wallets_version com cada carteira adicionada ou removida.
+    """
+    placeholders = ', '.join('?' for _ in keys)
+    values = dict(conn.execute(
+        f'SELECT key, value FROM app_settings WHERE key IN ({placeholders})', keys
+    ).fetchall())
+    return '.'.join(str(values.get(key, 0)) for key in keys)
+
+def rebuild_duplicates(conn, window_ms=None):
+    """Recalcular toda a tabela suspected_duplicates (p. ex. após mudar a janela)"""
+    if window_ms is None:
+        window_ms = DUPLICATE_WINDOW_MS
+    
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('DELETE FROM suspected_duplicates')
+        cursor.execute(f'''
+            INSERT INTO suspected_duplicates (transaction_id, amount_units, timestamp)
+            {DUPLICATE_NEIGHBOURS_SQL}
+        ''', {'window': window_ms})
+        total = cursor.rowcount
+        set_setting(cursor, 'duplicate_window_ms', window_ms)
+        # Avançar a versão dos dados para invalidar ETags e respostas em cache
+        next_change_seq(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return total
+
+def sync_duplicate_window(conn):
+    """Reconstruir os duplicados se a janela configurada mudou desde a última vez"""
+    stored = get_setting(conn, 'duplicate_window_ms')
+    if stored is not None and int(stored) == DUPLICATE_WINDOW_MS:
+        return
+    
+    total = rebuild_duplicates(conn)
+    print(f"Duplicados recalculados para janela de {DUPLICATE_WINDOW_MS} ms: {total} transações")
+
+def fetch_duplicate_page(conn, args):
+    """Uma página de duplicados suspeitos por (timestamp, id) decrescente"""
+    limit = parse_page_size(args)
+    clauses = []
+    params = []
+    if args.get('cursor'):
+        clauses.append('(d.timestamp, d.transaction_id) < (?, ?)')
+        params.extend(decode_page_cursor(args['cursor']))
+    
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT t.* FROM suspected_duplicates d
+        JOIN transactions t ON t.id = d.transaction_id
+        {where}
+        ORDER BY d.timestamp DESC, d.transaction_id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_page_cursor(rows[-1][5], rows[-1][0]) if has_more else None
+    
+    return {
+        'transactions': [transaction_to_dict(tx) for tx in rows],
+        'next_cursor': next_cursor,
+        'limit': limit
+    }
 
-        .notification.show {
-            transform: translateX(0);
-        }
+@app.route('/api/duplicates', methods=['GET'])
+def get_duplicate_transactions():
+    """Listar transações duplicadas (paginado)"""
+    try:
+        conn = get_db()
+        return cached_json_response(
+            data_version(conn, 'change_seq'),
+            lambda: fetch_duplicate_page(conn, request.args)
+        )
+    except InvalidFilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro ao buscar duplicados: {str(e)}'}), 500
 
-        .notification.success {
-            background: linear-gradient(45deg, #00ff88, #00cc6a);
-        }
+def fetch_dashboard_counters(conn):
+    """Todos os contadores do painel numa única consulta agregada"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(type = 'outgoing'), 0),
+            COALESCE(SUM(type = 'incoming'), 0),
+            (SELECT COUNT(*) FROM suspected_duplicates),
+            (SELECT COUNT(*) FROM wallets WHERE is_active = 1)
+        FROM transactions
+    ''')
+    total, outgoing, incoming, duplicates, wallets = cursor.fetchone()
+    return {
+        'all': total,
+        'outgoing': outgoing,
+        'incoming': incoming,
+        'duplicates': duplicates,
+        'wallets': wallets
+    }
+
+# Listagem paginada de cada aba do painel
+DASHBOARD_TABS = {
+    'all': lambda conn, args: fetch_transaction_page(conn, args),
+    'outgoing': lambda conn, args: fetch_transaction_page(conn, args, 'outgoing'),
+    'incoming': lambda conn, args: fetch_transaction_page(conn, args, 'incoming'),
+    'duplicates': fetch_duplicate_page
+}
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Contadores do painel e, opcionalmente, a primeira página da aba `tab`"""
+    try:
+        tab = request.args.get('tab')
+        if tab and tab not in DASHBOARD_TABS:
+            return jsonify({'error': f"tab deve ser um de: {', '.join(DASHBOARD_TABS)}"}), 400
+        
+        conn = get_db()
+        
+        def compute():
+            # A sequência é lida antes dos dados: alterações concorrentes voltam em /api/changes
+            dashboard = {'seq': current_change_seq(conn)}
+            dashboard['counters'] = fetch_dashboard_counters(conn)
+            if tab:
+                dashboard['tab'] = tab
+                dashboard['page'] = DASHBOARD_TABS[tab](conn, request.args)
+            return dashboard
+        
+        return cached_json_response(data_version(conn, 'change_seq', 'wallets_version'), compute)
+    except InvalidFilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro ao carregar painel: {str(e)}'}), 500
 
-        .notification.error {
-            background: linear-gradient(45deg, #ff4757, #ff3742);
-        }
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Transações criadas ou alteradas depois da sequência `since`
 
-        .empty-state {
-            text-align: center;
-            padding: 50px 20px;
-            color: #666;
-        }
+    O cliente guarda o `seq` devolvido e pede só o que mudou desde então,
+    em vez de recarregar as listas inteiras.
+    """
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({'error': 'since deve ser um número inteiro'}), 400
+        _check_int_range(since, 'since')
+        limit = parse_page_size(request.args)
+        
+        conn = get_db()
+        current_seq = current_change_seq(conn)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT t.*, d.transaction_id IS NOT NULL
+            FROM transactions t
+            LEFT JOIN suspected_duplicates d ON d.transaction_id = t.id
+            WHERE t.updated_seq > ?
+            ORDER BY t.updated_seq
+            LIMIT ?
+        ''', (since, limit + 1))
+        rows = cursor.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        changes = []
+        for tx in rows:
+            change = transaction_to_dict(tx)
+            change['updated_seq'] = tx[12]
+            change['is_duplicate'] = bool(tx[13])
+            changes.append(change)
+        
+        return jsonify({
+            'changes': changes,
+            'seq': changes[-1]['updated_seq'] if has_more else max(
+                [since, current_seq] + [change['updated_seq'] for change in changes[-1:]]
+            ),
+            'has_more': has_more
+        })
+    except InvalidFilterError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Erro ao buscar alterações: {str(e)}'}), 500
+
+def _set_transaction_note(cursor, transaction_id, note):
+    seq = next_change_seq(cursor)
+    cursor.execute(
+        'UPDATE transactions SET note = ?, updated_seq = ? WHERE id = ?',
+        (note, seq, transaction_id)
+    )
+
+def _toggle_transaction_completed(cursor, transaction_id):
+    """Inverter is_completed e retornar o novo valor (None se a transação não existir)"""
+    cursor.execute('SELECT is_completed FROM transactions WHERE id = ?', (transaction_id,))
+    result = cursor.fetchone()
+    if not result:
+        return None
+    
+    new_status = 1 if result[0] == 0 else 0
+    seq = next_change_seq(cursor)
+    cursor.execute(
+        'UPDATE transactions SET is_completed = ?, updated_seq = ? WHERE id = ?',
+        (new_status, seq, transaction_id)
+    )
+    return new_status
 
-        .empty-state h3 {
-            margin-bottom: 10px;
-            font-size: 1.5em;
-        }
+@app.route('/api/transactions/<int:transaction_id>/note', methods=['PUT'])
+def update_transaction_note(transaction_id):
+    """Atualizar nota da transação"""
+    try:
+        data = request.get_json()
+        note = data.get('note', '').strip()
+        
+        db_writer.execute(_set_transaction_note, transaction_id, note)
+        
+        return jsonify({'message': 'Nota atualizada com sucesso!'})
+    except WriterBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-        .loading {
-            text-align: center;
-            padding: 50px 20px;
-            color: #667eea;
-        }
+@app.route('/api/transactions/<int:transaction_id>/complete', methods=['PUT'])
+def toggle_transaction_complete(transaction_id):
+    """Marcar/desmarcar transação como completa"""
+    try:
+        new_status = db_writer.execute(_toggle_transaction_completed, transaction_id)
+        
+        if new_status is not None:
+            status = "completa" if new_status else "pendente"
+            message = f'Transação marcada como {status}!'
+        else:
+            message = 'Transação não encontrada'
+        
+        return jsonify({'message': message})
+    except WriterBusyError as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-        .spinner {
-            border: 4px solid #f3f3f3;
-            border-top: 4px solid #667eea;
-            border-radius: 50%;
-            width: 40px;
-            height: 40px;
-            animation: spin 1s linear infinite;
-            margin: 0 auto 20px;
-        }
+@app.route('/health')
+def health():
+    """Health check"""
+    circuit_closed = trongrid_client.breaker.state == CircuitBreaker.CLOSED
+    return jsonify({
+        'status': 'ok' if circuit_closed else 'degraded',
+        'service': 'USDT TRC20 Monitor',
+        'version': '1.0.0',
+        'ingestion_mode': INGESTION_MODE,
+        'trongrid': trongrid_client.stats(),
+        'trongrid_cache': trongrid_cache.stats(),
+        'events': events.stats(),
+        'response_cache': response_cache.stats(),
+        'db_writer': db_writer.stats()
+    })
 
-        @keyframes spin {
-            0% { transform: rotate(0deg); }
-            100% { transform: rotate(360deg); }
-        }
+class StaticAsset:
+    """Ficheiro do frontend guardado em memória já comprimido em cada codificação"""
+    
+    def __init__(self, name, content, mimetype):
+        self.name = name
+        self.mimetype = mimetype
+        self.digest = hashlib.sha256(content).hexdigest()[:12]
+        self.encodings = {'identity': content, 'gzip': gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(content, quality=11)
+    
+    @property
+    def hashed_name(self):
+        stem, extension = os.path.splitext(self.name)
+        return f'{stem}.{self.digest}{extension}'
+    
+    def _negotiate(self):
+        for encoding in ('br', 'gzip'):
+            if encoding in self.encodings and request.accept_encodings[encoding] > 0:
+                return encoding
+        return 'identity'
+    
+    def response(self, immutable=False):
+        encoding = self._negotiate()
+        etag = f'{self.digest}-{encoding}'
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.encodings[encoding], mimetype=self.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        if immutable:
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+        else:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+def load_static_assets(directory=STATIC_DIR):
+    """Ler e comprimir o frontend uma única vez, no arranque
+
+    Cada ficheiro fica disponível também com o hash do conteúdo no nome
+    (app.<hash>.js), servido com cache de longa duração; index.html é
+    reescrito para apontar para esses nomes e revalidado a cada visita.
+    """
+    assets = {}
+    index_html = None
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'rb') as f:
+            content = f.read()
+        if name == 'index.html':
+            index_html = content.decode('utf-8')
+            continue
+        asset = StaticAsset(name, content, mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        assets[name] = assets[asset.hashed_name] = asset
+    
+    for name, asset in list(assets.items()):
+        if name == asset.name:
+            index_html = index_html.replace(f'"/static/{name}"', f'"/static/{asset.hashed_name}"')
+    assets['index.html'] = StaticAsset('index.html', index_html.encode('utf-8'), 'text/html')
+    return assets
+
+static_assets = load_static_assets()
+
+@app.route('/static/<path:filename>')
+def static_asset(filename):
+    """Ficheiros do frontend; os nomes com hash nunca mudam e ficam em cache no browser"""
+    asset = static_assets.get(filename)
+    if asset is None or filename == 'index.html':
+        return jsonify({'error': 'Ficheiro não encontrado'}), 404
+    return asset.response(immutable=filename != asset.name)
 
-        @media (max-width: 768px) {
-            .wallet-form {
-                grid-template-columns: 1fr;
-            }
-            
-            .transaction-details {
-                grid-template-columns: 1fr;
-            }
+@app.route('/')
+def index():
+    """Servir frontend"""
+    return static_assets['index.html'].response()
+
+# Consultas críticas, os índices que cada uma deve usar e se o índice também dá a ordenação.
+# No filtro por contraparte o OR junta duas procuras (origem e destino) e ordena só as linhas
+# desse endereço, por isso o TEMP B-TREE é esperado aí.
+QUERY_PLAN_CHECKS = [
+    ('todas as transações',
+     'SELECT * FROM transactions WHERE (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT 101',
+     (0, 0), ('idx_transactions_timestamp',), True),
+    ('transações de saída',
+     "SELECT * FROM transactions WHERE type = 'outgoing' AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT 101",
+     (0, 0), ('idx_transactions_type_timestamp',), True),
+    ('transações de entrada',
+     "SELECT * FROM transactions WHERE type = 'incoming' ORDER BY timestamp DESC, id DESC LIMIT 101",
+     (), ('idx_transactions_type_timestamp',), True),
+    ('transações por carteira', 'SELECT * FROM transactions WHERE wallet_id = ? ORDER BY timestamp DESC, id DESC LIMIT 101',
+     (1,), ('idx_transactions_wallet_timestamp',), True),
+    ('transações por contraparte',
+     'SELECT * FROM transactions WHERE (from_address = ? OR to_address = ?) AND (timestamp, id) < (?, ?) '
+     'ORDER BY timestamp DESC, id DESC LIMIT 101',
+     ('T', 'T', 0, 0), ('idx_transactions_from_timestamp', 'idx_transactions_to_timestamp'), False),
+    ('transações por valor', 'SELECT * FROM transactions WHERE amount_units = ? AND timestamp BETWEEN ? AND ?',
+     (100 * USDT_UNIT, 0, 1), ('idx_transactions_amount_timestamp',), True),
+    ('carteiras ativas', 'SELECT id, address FROM wallets WHERE is_active = 1',
+     (), ('idx_wallets_active',), True),
+]
+
+def _apply_migrations(conn):
+    """Criar o esquema completo numa conexão nova (bancos temporários dos comandos de diagnóstico)"""
+    for _, _, steps in MIGRATIONS:
+        for step in steps:
+            step(conn.cursor()) if callable(step) else conn.execute(step)
+
+def _query_plan(conn, sql, params):
+    return ' | '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params))
+
+@app.cli.command('check-indexes')
+def check_indexes_command():
+    """Verificar com EXPLAIN QUERY PLAN que as consultas críticas usam índices.
+
+    Cada consulta é também planeada num esquema temporário sem os índices das
+    migrações (o plano "antes"), que tem de cair num SCAN; assim uma verificação
+    que passaria mesmo sem o índice aparece como falha.
+    """
+    import tempfile
+    
+    init_db()
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp, db_pool.connection() as conn:
+        baseline = sqlite3.connect(os.path.join(tmp, 'baseline.db'))
+        _apply_migrations(baseline)
+        for (index_name,) in baseline.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall():
+            baseline.execute(f'DROP INDEX {index_name}')
+        
+        for name, sql, params, indexes, ordered in QUERY_PLAN_CHECKS:
+            before = _query_plan(baseline, sql, params)
+            plan = _query_plan(conn, sql, params)
+            ok = (
+                all(index in plan for index in indexes)
+                and not (ordered and 'TEMP B-TREE' in plan)
+                and 'SCAN' in before
+                and not any(index in before for index in indexes)
+            )
+            failures += 0 if ok else 1
+            click.echo(f"[{'OK' if ok else 'FALHA'}] {name}")
+            click.echo(f"    antes:  {before}")
+            click.echo(f"    depois: {plan}")
+        baseline.close()
+    
+    if failures:
+        raise click.ClickException(f'{failures} consulta(s) sem o índice esperado')
+
+def _find_duplicates_pairwise(outgoing_transactions, window_ms):
+    """Algoritmo original O(n²), usado apenas para validar o resultado no benchmark"""
+    duplicates = []
+    seen = set()
+    for i, tx1 in enumerate(outgoing_transactions):
+        for j, tx2 in enumerate(outgoing_transactions):
+            if i != j and tx1[4] == tx2[4] and abs(tx1[5] - tx2[5]) <= window_ms:
+                if tx1[0] not in seen:
+                    seen.add(tx1[0])
+                    duplicates.append(tx1[0])
+                break
+    return duplicates
+
+@app.cli.command('bench-duplicates')
+@click.option('--rows', 'row_counts', type=int, multiple=True, default=[10000, 100000, 1000000],
+              help='Número de saídas sintéticas (pode repetir)')
+@click.option('--distinct-amounts', type=int, default=5000, help='Quantidade de valores distintos')
+def bench_duplicates_command(row_counts, distinct_amounts):
+    """Medir a deteção de duplicados em bancos sintéticos de vários tamanhos."""
+    import tempfile
+    
+    for row_count in row_counts:
+        # Em média uma saída a cada 10 segundos, como numa carteira de grande volume
+        span_ms = row_count * 10000
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+            _apply_migrations(conn)
             
-            .tabs {
-                flex-wrap: wrap;
-            }
+            rng = random.Random(row_count)
+            conn.executemany('''
+                INSERT INTO transactions (hash, from_address, to_address, amount_units, timestamp, type, block_number)
+                VALUES (?, 'TBench', 'TDest', ?, ?, 'outgoing', 0)
+            ''', (
+                (f'bench_{i}', rng.randint(1, distinct_amounts) * 10000, rng.randint(0, span_ms))
+                for i in range(row_count)
+            ))
+            conn.commit()
+            conn.execute('ANALYZE')
             
-            .tab {
-                min-width: auto;
-                flex: 1;
-            }
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>
-                📊 Monitor USDT TRC20 
-                <span class="badge">FUNCIONANDO</span>
-            </h1>
-            <p>Monitorize saídas de USDT TRC20 das suas carteiras Tron em tempo real</p>
-        </div>
-
-        <div class="controls">
-            <div class="auto-monitor">
-                <span>⚡</span>
-                <label for="autoMonitor">Monitorização Automática</label>
-                <label class="switch">
-                    <input type="checkbox" id="autoMonitor">
-                    <span class="slider"></span>
-                </label>
-            </div>
-            <button id="monitorBtn" class="monitor-btn">🔄 Monitorizar</button>
-            <div style="clear: both;"></div>
-        </div>
-
-        <div class="tabs">
-            <button class="tab active" data-tab="wallets">Carteiras (<span id="walletCount">0</span>)</button>
-            <button class="tab" data-tab="outgoing">Saídas (<span id="outgoingCount">0</span>)</button>
-            <button class="tab" data-tab="incoming">Entradas (<span id="incomingCount">0</span>)</button>
-            <button class="tab" data-tab="all">Todas (<span id="allCount">0</span>)</button>
-            <button class="tab" data-tab="duplicates">Duplicados (<span id="duplicateCount">0</span>)</button>
-        </div>
-
-        <div class="content">
-            <div id="walletsTab" class="tab-content">
-                <h2>Adicionar Nova Carteira</h2>
-                <p>Adicione endereços de carteiras Tron para monitorizar transações USDT TRC20 em tempo real</p>
-                
-                <div class="wallet-form">
-                    <div class="form-group">
-                        <label for="walletAddress">Endereço da Carteira</label>
-                        <input type="text" id="walletAddress" placeholder="TYASr5UV6HEcXatwdFQfmLVUqQQQMUxHLS">
-                    </div>
-                    <div class="form-group">
-                        <label for="walletName">Nome (Opcional)</label>
-                        <input type="text" id="walletName" placeholder="Carteira Principal">
-                    </div>
-                    <button id="addWalletBtn" class="btn btn-primary">+ Adicionar</button>
-                </div>
-
-                <div class="wallet-list">
-                    <h3>Carteiras Monitorizadas</h3>
-                    <p id="walletStatus">0 carteira(s) ativa(s)</p>
-                    <div id="walletListContainer"></div>
-                </div>
-            </div>
-
-            <div id="outgoingTab" class="tab-content" style="display: none;">
-                <h2>Transações de Saída</h2>
-                <p>USDT TRC20 enviado das suas carteiras</p>
-                <div id="outgoingTransactions"></div>
-            </div>
-
-            <div id="incomingTab" class="tab-content" style="display: none;">
-                <h2>Transações de Entrada</h2>
-                <p>USDT TRC20 recebido nas suas carteiras</p>
-                <div id="incomingTransactions"></div>
-            </div>
-
-            <div id="allTab" class="tab-content" style="display: none;">
-                <h2>Todas as Transações</h2>
-                <p>Histórico completo de transações USDT TRC20</p>
-                <div id="allTransactions"></div>
-            </div>
-
-            <div id="duplicatesTab" class="tab-content" style="display: none;">
-                <h2>Transações Duplicadas</h2>
-                <p>Transações suspeitas com mesmo valor em período próximo</p>
-                <div id="duplicateTransactions"></div>
-            </div>
-        </div>
-    </div>
-
-    <div id="notification" class="notification"></div>
-
-    <script>
-        // API Base URL (relativo para funcionar em qualquer servidor)
-        const API_BASE = '/api';
-        
-        let autoMonitorInterval = null;
-        let isAutoMonitoring = false;
-
-        // Elementos DOM
-        const tabs = document.querySelectorAll('.tab');
-        const tabContents = document.querySelectorAll('.tab-content');
-        const monitorBtn = document.getElementById('monitorBtn');
-        const autoMonitorCheckbox = document.getElementById('autoMonitor');
-        const addWalletBtn = document.getElementById('addWalletBtn');
-        const walletAddressInput = document.getElementById('walletAddress');
-        const walletNameInput = document.getElementById('walletName');
-
-        // Contadores
-        const counters = {
-            wallet: document.getElementById('walletCount'),
-            outgoing: document.getElementById('outgoingCount'),
-            incoming: document.getElementById('incomingCount'),
-            all: document.getElementById('allCount'),
-            duplicate: document.getElementById('duplicateCount')
-        };
-
-        // Containers
-        const containers = {
-            wallets: document.getElementById('walletListContainer'),
-            outgoing: document.getElementById('outgoingTransactions'),
-            incoming: document.getElementById('incomingTransactions'),
-            all: document.getElementById('allTransactions'),
-            duplicates: document.getElementById('duplicateTransactions')
-        };
-
-        // Inicialização
-        document.addEventListener('DOMContentLoaded', function() {
-            setupEventListeners();
-            loadWallets();
-            loadTransactions();
-        });
-
-        function setupEventListeners() {
-            // Tabs
-            tabs.forEach(tab => {
-                tab.addEventListener('click', () => switchTab(tab.dataset.tab));
-            });
-
-            // Monitor button
-            monitorBtn.addEventListener('click', monitorTransactions);
-
-            // Auto monitor
-            autoMonitorCheckbox.addEventListener('change', toggleAutoMonitor);
-
-            // Add wallet
-            addWalletBtn.addEventListener('click', addWallet);
-            walletAddressInput.addEventListener('keypress', (e) => {
-                if (e.key === 'Enter') addWallet();
-            });
-        }
-
-        function switchTab(tabName) {
-            // Update tab buttons
-            tabs.forEach(tab => {
-                tab.classList.toggle('active', tab.dataset.tab === tabName);
-            });
-
-            // Update tab content
-            tabContents.forEach(content => {
-                content.style.display = 'none';
-            });
-            document.getElementById(tabName + 'Tab').style.display = 'block';
-
-            // Load data for specific tab
-            if (tabName !== 'wallets') {
-                loadTransactions();
-            }
-        }
-
-        async function loadWallets() {
-            try {
-                const response = await fetch(`${API_BASE}/wallets`);
-                const wallets = await response.json();
-                
-                counters.wallet.textContent = wallets.length;
-                document.getElementById('walletStatus').textContent = `${wallets.length} carteira(s) ativa(s)`;
-                
-                renderWallets(wallets);
-            } catch (error) {
-                console.error('Erro ao carregar carteiras:', error);
-                showNotification('Erro ao carregar carteiras', 'error');
-            }
-        }
-
-        function renderWallets(wallets) {
-            const container = containers.wallets;
+            started = time.perf_counter()
+            duplicates = find_duplicate_transactions(conn)
+            elapsed = time.perf_counter() - started
+            click.echo(f"{row_count:>10} saídas: {len(duplicates):>8} duplicados em {elapsed * 1000:9.1f} ms")
             
-            if (wallets.length === 0) {
-                container.innerHTML = `
-                    <div class="empty-state">
-                        <h3>Nenhuma carteira adicionada</h3>
-                        <p>Adicione uma carteira para começar a monitorizar</p>
-                    </div>
-                `;
-                return;
-            }
-
-            container.innerHTML = wallets.map(wallet => `
-                <div class="wallet-item">
-                    <div class="wallet-info">
-                        <h4>${wallet.name}</h4>
-                        <p>${wallet.address}</p>
-                    </div>
-                    <button class="btn btn-danger btn-sm" onclick="removeWallet(${wallet.id})">
-                        Remover
-                    </button>
-                </div>
-            `).join('');
-        }
-
-        async function addWallet() {
-            const address = walletAddressInput.value.trim();
-            const name = walletNameInput.value.trim();
-
-            if (!address) {
-                showNotification('Endereço da carteira é obrigatório', 'error');
-                return;
-            }
-
-            try {
-                const response = await fetch(`${API_BASE}/wallets`, {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({ address, name })
-                });
-
-                const result = await response.json();
-
-                if (response.ok) {
-                    showNotification(result.message, 'success');
-                    walletAddressInput.value = '';
-                    walletNameInput.value = '';
-                    loadWallets();
-                } else {
-                    showNotification(result.error, 'error');
-                }
-            } catch (error) {
-                console.error('Erro ao adicionar carteira:', error);
-                showNotification('Erro ao adicionar carteira', 'error');
-            }
-        }
-
-        async function removeWallet(walletId) {
-            if (!confirm('Tem certeza que deseja remover esta carteira?')) {
-                return;
-            }
-
-            try {
-                const response = await fetch(`${API_BASE}/wallets/${walletId}`, {
-                    method: 'DELETE'
-                });
-
-                const result = await response.json();
-
-                if (response.ok) {
-                    showNotification(result.message, 'success');
-                    loadWallets();
-                    loadTransactions();
-                } else {
-                    showNotification(result.error, 'error');
-                }
-            } catch (error) {
-                console.error('Erro ao remover carteira:', error);
-                showNotification('Erro ao remover carteira', 'error');
-            }
-        }
-
-        async function monitorTransactions() {
-            monitorBtn.disabled = true;
-            monitorBtn.innerHTML = '⏳ Buscando na blockchain...';
-
-            try {
-                const response = await fetch(`${API_BASE}/monitor`, {
-                    method: 'POST'
-                });
-
-                const result = await response.json();
-
-                if (response.ok) {
-                    showNotification(result.message, 'success');
-                    loadTransactions();
-                } else {
-                    showNotification(result.error, 'error');
-                }
-            } catch (error) {
-                console.error('Erro na monitorização:', error);
-                showNotification('Erro na monitorização', 'error');
-            } finally {
-                monitorBtn.disabled = false;
-                monitorBtn.innerHTML = '🔄 Monitorizar';
-            }
-        }
-
-        function toggleAutoMonitor() {
-            isAutoMonitoring = autoMonitorCheckbox.checked;
-
-            if (isAutoMonitoring) {
-                autoMonitorInterval = setInterval(monitorTransactions, 120000); // 2 minutos
-                showNotification('Monitorização automática ativada (2 min)', 'success');
-            } else {
-                if (autoMonitorInterval) {
-                    clearInterval(autoMonitorInterval);
-                    autoMonitorInterval = null;
-                }
-                showNotification('Monitorização automática desativada', 'success');
-            }
-        }
-
-        async function loadTransactions() {
-            try {
-                // Carregar todos os tipos de transações
-                const [allResponse, outgoingResponse, incomingResponse, duplicatesResponse] = await Promise.all([
-                    fetch(`${API_BASE}/transactions`),
-                    fetch(`${API_BASE}/transactions/outgoing`),
-                    fetch(`${API_BASE}/transactions/incoming`),
-                    fetch(`${API_BASE}/duplicates`)
-                ]);
-
-                const [allTx, outgoingTx, incomingTx, duplicatesTx] = await Promise.all([
-                    allResponse.json(),
-                    outgoingResponse.json(),
-                    incomingResponse.json(),
-                    duplicatesResponse.json()
-                ]);
-
-                // Atualizar contadores
-                counters.all.textContent = allTx.length;
-                counters.outgoing.textContent = outgoingTx.length;
-                counters.incoming.textContent = incomingTx.length;
-                counters.duplicate.textContent = duplicatesTx.length;
-
-                // Renderizar transações
-                renderTransactions(containers.all, allTx);
-                renderTransactions(containers.outgoing, outgoingTx);
-                renderTransactions(containers.incoming, incomingTx);
-                renderTransactions(containers.duplicates, duplicatesTx);
-
-            } catch (error) {
-                console.error('Erro ao carregar transações:', error);
-                showNotification('Erro ao carregar transações', 'error');
-            }
-        }
-
-        function renderTransactions(container, transactions) {
-            if (transactions.length === 0) {
-                container.innerHTML = `
-                    <div class="empty-state">
-                        <h3>Nenhuma transação encontrada</h3>
-                        <p>Clique em "Monitorizar" para buscar transações</p>
-                    </div>
-                `;
-                return;
-            }
-
-            container.innerHTML = transactions.map(tx => `
-                <div class="transaction-item ${tx.type}">
-                    <div class="transaction-header">
-                        <div class="transaction-amount">${tx.amount.toFixed(2)} USDT</div>
-                        <div class="transaction-type ${tx.type}">
-                            ${tx.type === 'outgoing' ? 'Saída' : 'Entrada'}
-                        </div>
-                    </div>
-                    <div class="transaction-details">
-                        <div>
-                            <strong>Data/Hora</strong><br>
-                            ${formatDate(tx.timestamp)}
-                        </div>
-                        <div>
-                            <strong>Hash</strong><br>
-                            <a href="https://tronscan.org/#/transaction/${tx.hash}" target="_blank">
-                                ${tx.hash.substring(0, 20)}...${tx.hash.substring(tx.hash.length - 20)}
-                            </a>
-                        </div>
-                        <div>
-                            <strong>De</strong><br>
-                            ${tx.from_address.substring(0, 10)}...${tx.from_address.substring(tx.from_address.length - 10)}
-                        </div>
-                        <div>
-                            <strong>Para</strong><br>
-                            ${tx.to_address.substring(0, 10)}...${tx.to_address.substring(tx.to_address.length - 10)}
-                        </div>
-                    </div>
-                    <div class="transaction-actions">
-                        <button class="btn btn-primary btn-sm" onclick="addNote(${tx.id})">
-                            📝 ${tx.note ? 'Editar Nota' : 'Adicionar Nota'}
-                        </button>
-                        <button class="btn btn-primary btn-sm" onclick="toggleComplete(${tx.id}, ${tx.is_completed})">
-                            ${tx.is_completed ? '↩️ Marcar como Pendente' : '✅ Marcar como Completo'}
-                        </button>
-                        ${tx.type === 'outgoing' ? `
-                            <button class="btn btn-primary btn-sm" onclick="copyReceipt('${tx.hash}', ${tx.amount}, '${formatDate(tx.timestamp)}', '${tx.from_address}', '${tx.to_address}')">
-                                📄 Copiar Comprovante
-                            </button>
-                        ` : ''}
-                    </div>
-                    ${tx.note ? `<div style="margin-top: 10px; padding: 10px; background: #e9ecef; border-radius: 5px;"><strong>Nota:</strong> ${tx.note}</div>` : ''}
-                </div>
-            `).join('');
-        }
-
-        function formatDate(timestamp) {
-            const date = new Date(timestamp);
-            return date.toLocaleString('pt-BR');
-        }
-
-        function copyReceipt(hash, amount, date, fromAddress, toAddress) {
-            const receipt = `🧾 COMPROVANTE USDT TRC20
-
-💰 Valor: ${amount.toFixed(2)} USDT
-📅 Data: ${date}
-
-📤 De: ${fromAddress.substring(0, 10)}...${fromAddress.substring(fromAddress.length - 10)}
-📥 Para: ${toAddress.substring(0, 10)}...${toAddress.substring(toAddress.length - 10)}
-
-🔗 Hash: ${hash.substring(0, 20)}...${hash.substring(hash.length - 20)}
-
-🌐 Ver no TronScan:
-https://tronscan.org/#/transaction/${hash}
-
-✅ Comprovante gerado em ${new Date().toLocaleString('pt-BR')}
-📱 Pronto para compartilhar no WhatsApp!`;
-
-            navigator.clipboard.writeText(receipt).then(() => {
-                showNotification('Comprovante copiado! Cole no WhatsApp para compartilhar', 'success');
-            }).catch(() => {
-                showNotification('Erro ao copiar comprovante', 'error');
-            });
-        }
-
-        async function addNote(transactionId) {
-            const note = prompt('Digite a nota para esta transação:');
-            if (note === null) return;
-
-            try {
-                const response = await fetch(`${API_BASE}/transactions/${transactionId}/note`, {
-                    method: 'PUT',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({ note })
-                });
-
-                const result = await response.json();
-
-                if (response.ok) {
-                    showNotification(result.message, 'success');
-                    loadTransactions();
-                } else {
-                    showNotification(result.error, 'error');
-                }
-            } catch (error) {
-                console.error('Erro ao adicionar nota:', error);
-                showNotification('Erro ao adicionar nota', 'error');
-            }
-        }
-
-        async function toggleComplete(transactionId, currentStatus) {
-            try {
-                const response = await fetch(`${API_BASE}/transactions/${transactionId}/complete`, {
-                    method: 'PUT'
-                });
-
-                const result = await response.json();
-
-                if (response.ok) {
-                    showNotification(result.message, 'success');
-                    loadTransactions();
-                } else {
-                    showNotification(result.error, 'error');
-                }
-            } catch (error) {
-                console.error('Erro ao atualizar status:', error);
-                showNotification('Erro ao atualizar status', 'error');
-            }
-        }
+            if row_count <= 5000:
+                rows = conn.execute(
+                    "SELECT * FROM transactions WHERE type = 'outgoing' ORDER BY timestamp DESC, id DESC"
+                ).fetchall()
+                expected = _find_duplicates_pairwise(rows, DUPLICATE_WINDOW_MS)
+                if expected != [tx['id'] for tx in duplicates]:
+                    raise click.ClickException('Resultado difere do algoritmo original')
+                click.echo('           resultado idêntico ao algoritmo original')
+            conn.close()
 
-        function showNotification(message, type) {
-            const notification = document.getElementById('notification');
-            notification.textContent = message;
-            notification.className = `notification ${type}`;
-            notification.classList.add('show');
+@app.cli.command('rebuild-duplicates')
+def rebuild_duplicates_command():
+    """Recalcular todos os duplicados suspeitos com a janela atual."""
+    init_db()
+    with db_pool.connection() as conn:
+        total = rebuild_duplicates(conn)
+    click.echo(f"{total} transação(ões) marcada(s) como duplicado suspeito (janela de {DUPLICATE_WINDOW_MS} ms)")
+
+@app.cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='ndjson')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', help='Ficheiro de saída (padrão: stdout)')
+@click.option('--type', 'tx_type', type=click.Choice(['outgoing', 'incoming']), default=None)
+@click.option('--wallet-id', default=None)
+@click.option('--from', 'from_', default=None, help='Data inicial (ISO ou timestamp em ms)')
+@click.option('--to', default=None, help='Data final (ISO ou timestamp em ms)')
+@click.option('--min-amount', default=None)
+@click.option('--max-amount', default=None)
+@click.option('--counterparty', default=None)
+@click.option('--completed', default=None, help='true ou false')
+def export_command(fmt, output, tx_type, wallet_id, from_, to, min_amount, max_amount, counterparty, completed):
+    """Exportar transações em NDJSON ou CSV para reconciliação."""
+    args = {
+        'wallet_id': wallet_id, 'from': from_, 'to': to,
+        'min_amount': min_amount, 'max_amount': max_amount,
+        'counterparty': counterparty, 'completed': completed
+    }
+    try:
+        filters = parse_transaction_filters({k: v for k, v in args.items() if v is not None})
+    except InvalidFilterError as e:
+        raise click.BadParameter(str(e))
+    
+    # Mensagens de inicialização vão para stderr para não misturar com a exportação em stdout
+    with redirect_stdout(sys.stderr):
+        init_db()
+    with db_pool.connection() as conn:
+        for chunk in iter_transaction_export(conn, filters, tx_type, fmt):
+            output.write(chunk)
+
+@app.cli.command('backfill')
+@click.option('--wallet-id', type=int, help='Carteira a processar (por omissão, todas as ativas)')
+@click.option('--restart', is_flag=True, help='Recomeçar do início em vez de retomar')
+@click.option('--max-pages', type=int, default=None, help='Parar após este número de páginas')
+def backfill_command(wallet_id, restart, max_pages):
+    """Importar o histórico completo de transações das carteiras."""
+    init_db()
+    conn = db_pool.acquire()
+    cursor = conn.cursor()
+    if wallet_id is None:
+        cursor.execute('SELECT id, address FROM wallets WHERE is_active = 1')
+    else:
+        cursor.execute('SELECT id, address FROM wallets WHERE id = ?', (wallet_id,))
+    wallets = cursor.fetchall()
+    db_pool.release(conn)
+    
+    if not wallets:
+        raise click.ClickException('Nenhuma carteira encontrada')
+    
+    for wallet_id, address in wallets:
+        state = backfill_wallet(wallet_id, address, restart=restart, max_pages=max_pages)
+        click.echo(
+            f"{address}: {state['status']} - {state['pages_fetched']} página(s), "
+            f"{state['new_transactions']} nova(s) de {state['transactions_found']}"
+        )
 
-            setTimeout(() => {
-                notification.classList.remove('show');
-            }, 5000);
-        }
-    </script>
-</body>
-</html>
-    '''
+@app.cli.command('scheduler')
+def scheduler_command():
+    """Correr o agendador de monitorização como processo dedicado."""
+    init_db()
+    scheduler.configure(enabled=True)
+    click.echo(f"Agendador ativo: {scheduler.describe()}")
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        click.echo('Agendador terminado')
 
 if __name__ == '__main__':
     # Inicializar banco de dados
@@ -1364,5 +3904,9 @@ if __name__ == '__main__':
     print("Acesse: http://localhost:5000")
     
     # Executar aplicação
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    app.run(
+        host='0.0.0.0', port=5000, debug=True,
+        # O frontend é carregado no arranque: reiniciar também quando muda
+        extra_files=[os.path.join(STATIC_DIR, name) for name in os.listdir(STATIC_DIR)]
+    )
 
@@ -0,0 +1,686 @@
+// API Base URL (relativo para funcionar em qualquer servidor)
+const API_BASE = '/api';
+
+let autoMonitorInterval = null;
+let isAutoMonitoring = false;
+let schedulerInProcess = false;
+
+// Elementos DOM
+const tabs = document.querySelectorAll('.tab');
+const tabContents = document.querySelectorAll('.tab-content');
+const monitorBtn = document.getElementById('monitorBtn');
+const autoMonitorCheckbox = document.getElementById('autoMonitor');
+const addWalletBtn = document.getElementById('addWalletBtn');
+const walletAddressInput = document.getElementById('walletAddress');
+const walletNameInput = document.getElementById('walletName');
+
+// Contadores
+const counters = {
+    wallet: document.getElementById('walletCount'),
+    outgoing: document.getElementById('outgoingCount'),
+    incoming: document.getElementById('incomingCount'),
+    all: document.getElementById('allCount'),
+    duplicate: document.getElementById('duplicateCount')
+};
+
+// Containers
+const containers = {
+    wallets: document.getElementById('walletListContainer'),
+    outgoing: document.getElementById('outgoingTransactions'),
+    incoming: document.getElementById('incomingTransactions'),
+    all: document.getElementById('allTransactions'),
+    duplicates: document.getElementById('duplicateTransactions')
+};
+
+// Paginação das listas de transações
+const PAGE_SIZE = 100;
+const MONITOR_JOB_POLL_MS = 1000;
+const TRANSACTION_ENDPOINTS = {
+    all: `${API_BASE}/transactions`,
+    outgoing: `${API_BASE}/transactions/outgoing`,
+    incoming: `${API_BASE}/transactions/incoming`,
+    duplicates: `${API_BASE}/duplicates`
+};
+const nextCursors = { all: null, outgoing: null, incoming: null, duplicates: null };
+const loadedTabs = new Set();
+let activeTab = 'wallets';
+
+// Sincronização incremental (/api/changes)
+const CHANGES_PAGE_SIZE = 500;
+const MAX_SYNC_CHANGES = 2000;
+let lastSeq = 0;
+let syncing = false;
+let syncAgain = false;
+let syncTimer = null;
+
+// Canal de eventos (/api/events)
+let eventSource = null;
+const SYNC_DEBOUNCE_MS = 250;
+const loadMoreButtons = {};
+document.querySelectorAll('.load-more').forEach(button => {
+    loadMoreButtons[button.dataset.tab] = button;
+});
+
+// Inicialização
+document.addEventListener('DOMContentLoaded', function() {
+    setupEventListeners();
+    loadWallets();
+    loadTransactions();
+    loadSchedulerStatus();
+    connectEvents();
+});
+
+function setupEventListeners() {
+    // Tabs
+    tabs.forEach(tab => {
+        tab.addEventListener('click', () => switchTab(tab.dataset.tab));
+    });
+
+    // Carregar mais
+    Object.entries(loadMoreButtons).forEach(([tab, button]) => {
+        button.addEventListener('click', () => loadMoreTransactions(tab));
+    });
+
+    // Monitor button
+    monitorBtn.addEventListener('click', monitorTransactions);
+
+    // Auto monitor
+    autoMonitorCheckbox.addEventListener('change', toggleAutoMonitor);
+
+    // Add wallet
+    addWalletBtn.addEventListener('click', addWallet);
+    walletAddressInput.addEventListener('keypress', (e) => {
+        if (e.key === 'Enter') addWallet();
+    });
+}
+
+function switchTab(tabName) {
+    activeTab = tabName;
+
+    // Update tab buttons
+    tabs.forEach(tab => {
+        tab.classList.toggle('active', tab.dataset.tab === tabName);
+    });
+
+    // Update tab content
+    tabContents.forEach(content => {
+        content.style.display = 'none';
+    });
+    document.getElementById(tabName + 'Tab').style.display = 'block';
+
+    // Carregar a aba só quando é aberta
+    if (tabName !== 'wallets') {
+        loadTab(tabName);
+    }
+}
+
+async function loadWallets() {
+    try {
+        const response = await fetch(`${API_BASE}/wallets`);
+        const wallets = await response.json();
+        
+        counters.wallet.textContent = wallets.length;
+        document.getElementById('walletStatus').textContent = `${wallets.length} carteira(s) ativa(s)`;
+        
+        renderWallets(wallets);
+    } catch (error) {
+        console.error('Erro ao carregar carteiras:', error);
+        showNotification('Erro ao carregar carteiras', 'error');
+    }
+}
+
+function renderWallets(wallets) {
+    const container = containers.wallets;
+    
+    if (wallets.length === 0) {
+        container.innerHTML = `
+            <div class="empty-state">
+                <h3>Nenhuma carteira adicionada</h3>
+                <p>Adicione uma carteira para começar a monitorizar</p>
+            </div>
+        `;
+        return;
+    }
+
+    container.innerHTML = wallets.map(wallet => `
+        <div class="wallet-item">
+            <div class="wallet-info">
+                <h4>${wallet.name}</h4>
+                <p>${wallet.address}</p>
+            </div>
+            <div class="wallet-actions">
+                <button class="btn btn-primary btn-sm" onclick="pollWallet(${wallet.id})">
+                    Consultar
+                </button>
+                <button class="btn btn-danger btn-sm" onclick="removeWallet(${wallet.id})">
+                    Remover
+                </button>
+            </div>
+        </div>
+    `).join('');
+}
+
+async function addWallet() {
+    const address = walletAddressInput.value.trim();
+    const name = walletNameInput.value.trim();
+
+    if (!address) {
+        showNotification('Endereço da carteira é obrigatório', 'error');
+        return;
+    }
+
+    try {
+        const response = await fetch(`${API_BASE}/wallets`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ address, name })
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showNotification(result.message, 'success');
+            walletAddressInput.value = '';
+            walletNameInput.value = '';
+            loadWallets();
+        } else {
+            showNotification(result.error, 'error');
+        }
+    } catch (error) {
+        console.error('Erro ao adicionar carteira:', error);
+        showNotification('Erro ao adicionar carteira', 'error');
+    }
+}
+
+async function removeWallet(walletId) {
+    if (!confirm('Tem certeza que deseja remover esta carteira?')) {
+        return;
+    }
+
+    try {
+        const response = await fetch(`${API_BASE}/wallets/${walletId}`, {
+            method: 'DELETE'
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showNotification(result.message, 'success');
+            loadWallets();
+            loadTransactions();
+        } else {
+            showNotification(result.error, 'error');
+        }
+    } catch (error) {
+        console.error('Erro ao remover carteira:', error);
+        showNotification('Erro ao remover carteira', 'error');
+    }
+}
+
+async function pollWallet(walletId) {
+    try {
+        const response = await fetch(`${API_BASE}/wallets/${walletId}/poll`, {
+            method: 'POST'
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showMonitorJobResult(await waitForMonitorJob(result.job));
+        } else {
+            showNotification(result.error, 'error');
+        }
+    } catch (error) {
+        console.error('Erro ao consultar carteira:', error);
+        showNotification('Erro ao consultar carteira', 'error');
+    }
+}
+
+async function monitorTransactions() {
+    monitorBtn.disabled = true;
+    monitorBtn.innerHTML = '⏳ Buscando na blockchain...';
+
+    try {
+        const response = await fetch(`${API_BASE}/monitor`, {
+            method: 'POST'
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showMonitorJobResult(await waitForMonitorJob(result.job));
+        } else {
+            showNotification(result.error, 'error');
+        }
+    } catch (error) {
+        console.error('Erro na monitorização:', error);
+        showNotification('Erro na monitorização', 'error');
+    } finally {
+        monitorBtn.disabled = false;
+        monitorBtn.innerHTML = '🔄 Monitorizar';
+    }
+}
+
+async function waitForMonitorJob(job) {
+    // A varredura corre no servidor; consultar o trabalho até terminar
+    while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, MONITOR_JOB_POLL_MS));
+        const response = await fetch(`${API_BASE}/monitor/jobs/${job.id}`);
+        const result = await response.json();
+        if (!response.ok) throw new Error(result.error);
+        job = result;
+    }
+    return job;
+}
+
+function showMonitorJobResult(job) {
+    if (job.status === 'completed') {
+        showNotification(job.result.message, 'success');
+        syncChanges();
+    } else {
+        showNotification(job.error, 'error');
+    }
+}
+
+async function toggleAutoMonitor() {
+    // A monitorização automática corre no servidor; o browser só lê os resultados
+    try {
+        const response = await fetch(`${API_BASE}/scheduler`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ enabled: autoMonitorCheckbox.checked })
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showNotification(result.message, 'success');
+            applySchedulerStatus(result.scheduler);
+        } else {
+            autoMonitorCheckbox.checked = !autoMonitorCheckbox.checked;
+            showNotification(result.error, 'error');
+        }
+    } catch (error) {
+        autoMonitorCheckbox.checked = !autoMonitorCheckbox.checked;
+        console.error('Erro ao alterar monitorização automática:', error);
+        showNotification('Erro ao alterar monitorização automática', 'error');
+    }
+}
+
+async function loadSchedulerStatus() {
+    try {
+        const response = await fetch(`${API_BASE}/scheduler`);
+        applySchedulerStatus(await response.json());
+    } catch (error) {
+        console.error('Erro ao carregar estado do agendador:', error);
+    }
+}
+
+function applySchedulerStatus(status) {
+    // Com o agendador num processo dedicado o interruptor não tem efeito aqui; as novidades
+    // gravadas por esse processo chegam pela leitura periódica
+    isAutoMonitoring = status.enabled || !status.in_process;
+    schedulerInProcess = status.running;
+    autoMonitorCheckbox.checked = isAutoMonitoring;
+    autoMonitorCheckbox.disabled = !status.in_process;
+    autoMonitorCheckbox.title = status.in_process ? '' : 'O agendador corre num processo dedicado';
+
+    if (isAutoMonitoring && !autoMonitorInterval) {
+        autoMonitorInterval = setInterval(pollChanges, 30000); // só leitura
+    } else if (!isAutoMonitoring && autoMonitorInterval) {
+        clearInterval(autoMonitorInterval);
+        autoMonitorInterval = null;
+    }
+}
+
+async function loadTransactions() {
+    // Contadores e aba visível num só pedido; as outras abas recarregam quando forem abertas
+    loadedTabs.clear();
+    try {
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (activeTab in TRANSACTION_ENDPOINTS) params.set('tab', activeTab);
+
+        const response = await fetch(`${API_BASE}/dashboard?${params}`);
+        const dashboard = await response.json();
+        if (!response.ok) throw new Error(dashboard.error);
+
+        lastSeq = dashboard.seq;
+        updateCounters(dashboard.counters);
+        if (dashboard.page) {
+            renderTransactionPage(dashboard.tab, dashboard.page);
+            loadedTabs.add(dashboard.tab);
+        }
+    } catch (error) {
+        console.error('Erro ao carregar transações:', error);
+        showNotification('Erro ao carregar transações', 'error');
+    }
+}
+
+async function loadTab(tab) {
+    if (loadedTabs.has(tab)) return;
+
+    try {
+        const page = await fetchTransactionPage(tab);
+        renderTransactionPage(tab, page);
+        loadedTabs.add(tab);
+    } catch (error) {
+        console.error('Erro ao carregar transações:', error);
+        showNotification('Erro ao carregar transações', 'error');
+    }
+}
+
+function pollChanges() {
+    // Com o canal de eventos ligado ao processo do agendador, as novidades chegam sozinhas
+    if (schedulerInProcess && eventSource && eventSource.readyState === EventSource.OPEN) return;
+    syncChanges();
+}
+
+function connectEvents() {
+    if (!window.EventSource) return;
+
+    // O browser volta a ligar sozinho; o evento hello indica o que se perdeu entretanto
+    eventSource = new EventSource(`${API_BASE}/events`);
+    eventSource.addEventListener('hello', event => {
+        if (JSON.parse(event.data).seq > lastSeq && lastSeq > 0) scheduleSync();
+    });
+    ['transactions', 'duplicates', 'resync'].forEach(name => {
+        eventSource.addEventListener(name, scheduleSync);
+    });
+    eventSource.addEventListener('sweep', event => showSweepProgress(JSON.parse(event.data)));
+}
+
+function scheduleSync() {
+    // Agrupar rajadas de eventos num só pedido a /api/changes
+    if (syncTimer) return;
+    syncTimer = setTimeout(() => {
+        syncTimer = null;
+        syncChanges();
+    }, SYNC_DEBOUNCE_MS);
+}
+
+function showSweepProgress(progress) {
+    if (progress.phase === 'finished') {
+        if (!monitorBtn.disabled) monitorBtn.innerHTML = '🔄 Monitorizar';
+        return;
+    }
+    monitorBtn.innerHTML = `⏳ ${progress.wallets_done}/${progress.wallets_total} carteiras...`;
+}
+
+async function syncChanges() {
+    // Buscar apenas as transações criadas ou alteradas desde a última sincronização
+    if (syncing) {
+        syncAgain = true;
+        return;
+    }
+    syncing = true;
+    try {
+        let page;
+        let changed = 0;
+        do {
+            const response = await fetch(`${API_BASE}/changes?since=${lastSeq}&limit=${CHANGES_PAGE_SIZE}`);
+            page = await response.json();
+            if (!response.ok) throw new Error(page.error);
+
+            page.changes.forEach(applyChange);
+            changed += page.changes.length;
+            lastSeq = page.seq;
+        } while (page.has_more && changed < MAX_SYNC_CHANGES);
+
+        if (page.has_more) {
+            // Demasiadas alterações: mais barato recarregar a aba visível
+            await loadTransactions();
+        } else if (changed > 0) {
+            await refreshCounters();
+        }
+    } catch (error) {
+        console.error('Erro ao sincronizar alterações:', error);
+        showNotification('Erro ao sincronizar transações', 'error');
+    } finally {
+        syncing = false;
+        if (syncAgain) {
+            syncAgain = false;
+            syncChanges();
+        }
+    }
+}
+
+function applyChange(tx) {
+    loadedTabs.forEach(tab => {
+        const container = containers[tab];
+        const existing = container.querySelector(`.transaction-item[data-id="${tx.id}"]`);
+        const belongs = tab === 'all' || tab === tx.type || (tab === 'duplicates' && tx.is_duplicate);
+
+        if (existing && belongs) {
+            existing.outerHTML = renderTransaction(tx);
+        } else if (existing) {
+            existing.remove();
+        } else if (belongs) {
+            insertTransaction(tab, tx);
+        }
+    });
+}
+
+function insertTransaction(tab, tx) {
+    // Manter a ordem (timestamp, id) decrescente da lista já carregada
+    const container = containers[tab];
+    const html = renderTransaction(tx);
+    const emptyState = container.querySelector('.empty-state');
+    if (emptyState) emptyState.remove();
+
+    for (const item of container.querySelectorAll('.transaction-item')) {
+        const timestamp = Number(item.dataset.timestamp);
+        if (timestamp < tx.timestamp || (timestamp === tx.timestamp && Number(item.dataset.id) < tx.id)) {
+            item.insertAdjacentHTML('beforebegin', html);
+            return;
+        }
+    }
+
+    // Mais antiga que tudo o que está carregado: aparece ao paginar, se ainda houver páginas
+    if (!nextCursors[tab]) {
+        container.insertAdjacentHTML('beforeend', html);
+    }
+}
+
+async function refreshCounters() {
+    const response = await fetch(`${API_BASE}/dashboard`);
+    const dashboard = await response.json();
+    if (response.ok) updateCounters(dashboard.counters);
+}
+
+function updateCounters(values) {
+    counters.all.textContent = values.all;
+    counters.outgoing.textContent = values.outgoing;
+    counters.incoming.textContent = values.incoming;
+    counters.duplicate.textContent = values.duplicates;
+    counters.wallet.textContent = values.wallets;
+}
+
+async function fetchTransactionPage(tab, cursor = null) {
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    if (cursor) params.set('cursor', cursor);
+
+    const response = await fetch(`${TRANSACTION_ENDPOINTS[tab]}?${params}`);
+    const page = await response.json();
+    if (!response.ok) throw new Error(page.error);
+    return page;
+}
+
+function renderTransactionPage(tab, page, append = false) {
+    nextCursors[tab] = page.next_cursor;
+    renderTransactions(containers[tab], page.transactions, append);
+    loadMoreButtons[tab].style.display = page.next_cursor ? 'block' : 'none';
+}
+
+async function loadMoreTransactions(tab) {
+    if (!nextCursors[tab]) return;
+
+    const button = loadMoreButtons[tab];
+    button.disabled = true;
+    try {
+        const page = await fetchTransactionPage(tab, nextCursors[tab]);
+        renderTransactionPage(tab, page, true);
+    } catch (error) {
+        console.error('Erro ao carregar mais transações:', error);
+        showNotification('Erro ao carregar mais transações', 'error');
+    } finally {
+        button.disabled = false;
+    }
+}
+
+function renderTransactions(container, transactions, append = false) {
+    if (transactions.length === 0 && !append) {
+        container.innerHTML = `
+            <div class="empty-state">
+                <h3>Nenhuma transação encontrada</h3>
+                <p>Clique em "Monitorizar" para buscar transações</p>
+            </div>
+        `;
+        return;
+    }
+
+    const html = transactions.map(renderTransaction).join('');
+
+    if (append) {
+        container.insertAdjacentHTML('beforeend', html);
+    } else {
+        container.innerHTML = html;
+    }
+}
+
+function renderTransaction(tx) {
+    return `
+    <div class="transaction-item ${tx.type}" data-id="${tx.id}" data-timestamp="${tx.timestamp}">
+        <div class="transaction-header">
+            <div class="transaction-amount">${tx.amount.toFixed(2)} USDT</div>
+            <div class="transaction-type ${tx.type}">
+                ${tx.type === 'outgoing' ? 'Saída' : 'Entrada'}
+            </div>
+        </div>
+        <div class="transaction-details">
+            <div>
+                <strong>Data/Hora</strong><br>
+                ${formatDate(tx.timestamp)}
+            </div>
+            <div>
+                <strong>Hash</strong><br>
+                <a href="https://tronscan.org/#/transaction/${tx.hash}" target="_blank">
+                    ${tx.hash.substring(0, 20)}...${tx.hash.substring(tx.hash.length - 20)}
+                </a>
+            </div>
+            <div>
+                <strong>De</strong><br>
+                ${tx.from_address.substring(0, 10)}...${tx.from_address.substring(tx.from_address.length - 10)}
+            </div>
+            <div>
+                <strong>Para</strong><br>
+                ${tx.to_address.substring(0, 10)}...${tx.to_address.substring(tx.to_address.length - 10)}
+            </div>
+        </div>
+        <div class="transaction-actions">
+            <button class="btn btn-primary btn-sm" onclick="addNote(${tx.id})">
+                📝 ${tx.note ? 'Editar Nota' : 'Adicionar Nota'}
+            </button>
+            <button class="btn btn-primary btn-sm" onclick="toggleComplete(${tx.id}, ${tx.is_completed})">
+                ${tx.is_completed ? '↩️ Marcar como Pendente' : '✅ Marcar como Completo'}
+            </button>
+            ${tx.type === 'outgoing' ? `
+                <button class="btn btn-primary btn-sm" onclick="copyReceipt('${tx.hash}', ${tx.amount}, '${formatDate(tx.timestamp)}', '${tx.from_address}', '${tx.to_address}')">
+                    📄 Copiar Comprovante
+                </button>
+            ` : ''}
+        </div>
+        ${tx.note ? `<div style="margin-top: 10px; padding: 10px; background: #e9ecef; border-radius: 5px;"><strong>Nota:</strong> ${tx.note}</div>` : ''}
+    </div>
+`;
+}
+
+function formatDate(timestamp) {
+    const date = new Date(timestamp);
+    return date.toLocaleString('pt-BR');
+}
+
+function copyReceipt(hash, amount, date, fromAddress, toAddress) {
+    const receipt = `🧾 COMPROVANTE USDT TRC20
+
+💰 Valor: ${amount.toFixed(2)} USDT
+📅 Data: ${date}
+
+📤 De: ${fromAddress.substring(0, 10)}...${fromAddress.substring(fromAddress.length - 10)}
+📥 Para: ${toAddress.substring(0, 10)}...${toAddress.substring(toAddress.length - 10)}
+
+🔗 Hash: ${hash.substring(0, 20)}...${hash.substring(hash.length - 20)}
+
+🌐 Ver no TronScan:
+https://tronscan.org/#/transaction/${hash}
+
+✅ Comprovante gerado em ${new Date().toLocaleString('pt-BR')}
+📱 Pronto para compartilhar no WhatsApp!`;
+
+    navigator.clipboard.writeText(receipt).then(() => {
+        showNotification('Comprovante copiado! Cole no WhatsApp para compartilhar', 'success');
+    }).catch(() => {
+        showNotification('Erro ao copiar comprovante', 'error');
+    });
+}
+
+async function addNote(transactionId) {
+    const note = prompt('Digite a nota para esta transação:');
+    if (note === null) return;
+
+    try {
+        const response = await fetch(`${API_BASE}/transactions/${transactionId}/note`, {
+            method: 'PUT',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ note })
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showNotification(result.message, 'success');
+            syncChanges();
+        } else {
+            showNotification(result.error, 'error');
+        }
+    } catch (error) {
+        console.error('Erro ao adicionar nota:', error);
+        showNotification('Erro ao adicionar nota', 'error');
+    }
+}
+
+async function toggleComplete(transactionId, currentStatus) {
+    try {
+        const response = await fetch(`${API_BASE}/transactions/${transactionId}/complete`, {
+            method: 'PUT'
+        });
+
+        const result = await response.json();
+
+        if (response.ok) {
+            showNotification(result.message, 'success');
+            syncChanges();
+        } else {
+            showNotification(result.error, 'error');
+        }
+    } catch (error) {
+        console.error('Erro ao atualizar status:', error);
+        showNotification('Erro ao atualizar status', 'error');
+    }
+}
+
+function showNotification(message, type) {
+    const notification = document.getElementById('notification');
+    notification.textContent = message;
+    notification.className = `notification ${type}`;
+    notification.classList.add('show');
+
+    setTimeout(() => {
+        notification.classList.remove('show');
+    }, 5000);
+}